@@ -0,0 +1,100 @@
+"""
+Delivery assignment.
+
+``assign_orders`` hands a set of orders to one delivery user with a single
+``UPDATE``. ``auto_assign`` spreads unassigned orders that are ready to ship
+(COD, or Razorpay and paid) over all delivery users, always giving the next
+order to whoever currently has the fewest open orders. Workloads come from
+one grouped ``COUNT`` and each chunk of ``AUTO_ASSIGN_CHUNK_SIZE`` orders is
+written with one ``bulk_update`` in its own short transaction, stamped just
+before the write so delivery delta sync never misses it.
+"""
+import heapq
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.events import publish_orders
+from core.models import Order
+from core.orders import record_unassignments
+
+OPEN_STATUSES = ("placed", "packed", "shipped")
+AUTO_ASSIGN_CHUNK_SIZE = 500
+
+# Razorpay orders are only handed out once paid
+PAYABLE = Q(payment_method="cod") | Q(is_paid=True)
+
+
+def delivery_workloads():
+    """``{user_id: open order count}`` for every delivery user, in one query."""
+    rows = (
+        User.objects.filter(profile__role="delivery", is_active=True)
+        .annotate(open_orders=Count("assigned_orders", filter=Q(assigned_orders__status__in=OPEN_STATUSES)))
+        .values_list("id", "open_orders")
+    )
+    return dict(rows)
+
+
+def assign_orders(order_ids, delivery_user):
+    """Assign every still-open order in ``order_ids`` to ``delivery_user``; returns the ids assigned."""
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=OPEN_STATUSES)
+            .only("pk", "status", "is_paid", "total_amount", "assigned_delivery")
+        )
+        ids = [o.pk for o in orders]
+        Order.objects.filter(pk__in=ids).update(assigned_delivery=delivery_user, updated_at=timezone.now())
+
+        previous = {o.pk: o.assigned_delivery_id for o in orders}
+        record_unassignments(previous, delivery_user.pk)
+        for o in orders:
+            o.assigned_delivery_id = delivery_user.pk
+        publish_orders(orders, "assigned", previous)
+    return ids
+
+
+def auto_assign(limit=None):
+    """
+    Assign unassigned, payable open orders (oldest first) to the least busy
+    delivery users, at most ``limit`` of them (``None`` for all). Returns
+    ``{user_id: [order ids]}``.
+    """
+    if limit is not None and limit < 0:
+        raise ValueError("limit must not be negative")
+    loads = delivery_workloads()
+    if not loads:
+        return {}
+    heap = [(load, user_id) for user_id, load in loads.items()]
+    heapq.heapify(heap)
+
+    assigned = {}
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = AUTO_ASSIGN_CHUNK_SIZE if remaining is None else min(remaining, AUTO_ASSIGN_CHUNK_SIZE)
+        with transaction.atomic():
+            batch = list(
+                Order.objects.select_for_update()
+                .filter(PAYABLE, assigned_delivery__isnull=True, status__in=OPEN_STATUSES)
+                .only("pk", "status", "is_paid", "total_amount")
+                .order_by("created_at", "pk")[:size]
+            )
+            for order in batch:
+                load, user_id = heapq.heappop(heap)
+                order.assigned_delivery_id = user_id
+                assigned.setdefault(user_id, []).append(order.pk)
+                heapq.heappush(heap, (load + 1, user_id))
+
+            now = timezone.now()
+            for order in batch:
+                order.updated_at = now
+            Order.objects.bulk_update(batch, ["assigned_delivery", "updated_at"])
+            publish_orders(batch, "assigned")
+
+        if len(batch) < size:
+            break
+        if remaining is not None:
+            remaining -= len(batch)
+    return assigned
@@ -0,0 +1,92 @@
+"""
+Streaming order exports.
+
+Orders are read with ``iterator(chunk_size=...)`` and their items prefetched
+per chunk, and each row is encoded as soon as it is read, so memory use is
+bounded by the chunk size and the first bytes leave before the query has
+finished.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from core.models import OrderItem
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_HEADER = [
+    "order_id", "created_at", "status", "customer", "full_name", "phone", "address",
+    "payment_method", "is_paid", "order_total", "delivery_user",
+    "medicine_id", "medicine", "qty", "unit_price", "line_total",
+]
+
+
+class _Echo:
+    # csv.writer wants a file; hand each encoded line straight back instead
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    # keep customer-entered text from being run as a spreadsheet formula
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def export_queryset(orders):
+    items = (
+        OrderItem.objects.select_related("medicine")
+        .only("order", "qty", "price", "medicine__name")
+        .order_by("id")
+    )
+    return (
+        orders.select_related("user", "assigned_delivery")
+        .prefetch_related(Prefetch("items", queryset=items))
+        .order_by("id")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _order_fields(order):
+    return {
+        "order_id": order.id,
+        "created_at": order.created_at.isoformat(),
+        "status": order.status,
+        "customer": order.user.username,
+        "full_name": order.full_name,
+        "phone": order.phone,
+        "address": order.address,
+        "payment_method": order.payment_method,
+        "is_paid": order.is_paid,
+        "order_total": order.total_amount,
+        "delivery_user": order.assigned_delivery.username if order.assigned_delivery else "",
+    }
+
+
+def csv_rows(orders):
+    """One CSV line per order item (orders without items get one line with empty item columns)."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in export_queryset(orders):
+        fields = [_cell(v) for v in _order_fields(order).values()]
+        lines = order.items.all()
+        if not lines:
+            yield writer.writerow(fields + ["", "", "", "", ""])
+        for item in lines:
+            yield writer.writerow(
+                fields + [item.medicine.id, _cell(item.medicine.name), item.qty, item.price, item.qty * item.price]
+            )
+
+
+def ndjson_rows(orders):
+    """One JSON object per order, with its items nested."""
+    for order in export_queryset(orders):
+        data = _order_fields(order)
+        data["items"] = [
+            {"medicine_id": item.medicine.id, "medicine": item.medicine.name, "qty": item.qty, "unit_price": item.price}
+            for item in order.items.all()
+        ]
+        yield json.dumps(data, cls=DjangoJSONEncoder) + "\n"
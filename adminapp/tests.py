@@ -1,3 +1,82 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Medicine, Order
+from core.orders import place_order
+from core.pricing import CartLine
+
+from . import assignment
+from .assignment import auto_assign, delivery_workloads
+
+
+class AutoAssignTests(TestCase):
+    def setUp(self):
+        self.busy = self.rider("busy")
+        self.idle = self.rider("idle")
+        self.customer = User.objects.create_user("customer", password="x")
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=100)
+
+    def rider(self, username, active=True):
+        user = User.objects.create_user(username, password="x", is_active=active)
+        user.profile.role = "delivery"
+        user.profile.save()
+        return user
+
+    def order(self, payment_method="cod", **fields):
+        order = place_order(
+            self.customer, [CartLine(self.medicine, 1)],
+            full_name="Test User", phone="9999999999", address="1 Test Street", payment_method=payment_method,
+        )
+        if fields:
+            Order.objects.filter(pk=order.pk).update(**fields)
+        return order
+
+    def test_workloads_count_open_orders_of_active_riders(self):
+        self.order(assigned_delivery=self.busy)
+        self.order(assigned_delivery=self.busy, status="delivered")
+        self.rider("gone", active=False)
+
+        self.assertEqual(delivery_workloads(), {self.busy.pk: 1, self.idle.pk: 0})
+
+    def test_next_order_goes_to_the_least_busy_rider(self):
+        self.order(assigned_delivery=self.busy)
+        self.order(assigned_delivery=self.busy)
+        new = [self.order() for _ in range(4)]
+        unpaid = self.order(payment_method="razorpay")
+
+        assigned = auto_assign()
+
+        self.assertEqual(len(assigned[self.idle.pk]), 3)
+        self.assertEqual(len(assigned[self.busy.pk]), 1)
+        self.assertEqual(delivery_workloads(), {self.busy.pk: 3, self.idle.pk: 3})
+        self.assertEqual(assigned[self.idle.pk][:2], [new[0].pk, new[1].pk])
+        self.assertIsNone(Order.objects.get(pk=unpaid.pk).assigned_delivery_id)
+
+    def test_limit_across_chunks(self):
+        orders = [self.order() for _ in range(5)]
+
+        self.assertEqual(auto_assign(limit=0), {})
+        with mock.patch.object(assignment, "AUTO_ASSIGN_CHUNK_SIZE", 2):
+            assigned = auto_assign(limit=3)
+
+        self.assertEqual(sorted(pk for ids in assigned.values() for pk in ids), [o.pk for o in orders[:3]])
+        with mock.patch.object(assignment, "AUTO_ASSIGN_CHUNK_SIZE", 2):
+            auto_assign()
+        self.assertFalse(Order.objects.filter(assigned_delivery__isnull=True).exists())
+
+    def test_view_rejects_negative_limit(self):
+        admin = User.objects.create_user("boss", password="x")
+        admin.profile.role = "admin"
+        admin.profile.save()
+        self.client.force_login(admin)
+        self.order()
+
+        self.client.post(reverse("adminapp:auto_assign_delivery"), {"limit": "-1"})
+        self.assertFalse(Order.objects.filter(assigned_delivery__isnull=False).exists())
 
-# Create your tests here.
+        self.client.post(reverse("adminapp:auto_assign_delivery"), {"limit": "1"})
+        self.assertTrue(Order.objects.filter(assigned_delivery__isnull=False).exists())
@@ -6,6 +6,10 @@ app_name = "adminapp"
 urlpatterns = [
    path("admin-dashboard/", views.admin_dashboard, name="admin_dashboard"),
    path("assign-delivery/<int:order_id>/", views.assign_delivery, name="assign_delivery"),
+   path("bulk-assign-delivery/", views.bulk_assign_delivery, name="bulk_assign_delivery"),
+   path("auto-assign-delivery/", views.auto_assign_delivery, name="auto_assign_delivery"),
+   path("cancel-stale-orders/", views.cancel_stale_orders, name="cancel_stale_orders"),
+   path("export-orders/", views.export_orders, name="export_orders"),
    path("admin-login/", views.admin_login, name="admin_login"),
 
 ]
\ No newline at end of file
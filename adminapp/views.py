@@ -1,29 +1,147 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import url_has_allowed_host_and_scheme
 
+from .assignment import assign_orders, auto_assign
+from .export import csv_rows, ndjson_rows
 from .utils import admin_required
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login
 from django.shortcuts import render, redirect
-from core.models import Order, Profile
+from core import stats
+from core.events import publish_orders
+from core.models import Order, OrderDailyStat, Profile
+from core.orders import cancel_orders, record_unassignments, stale_unpaid_orders
+
+CANCEL_CHUNK_SIZE = 500
+
+
+def _day_start(value):
+    day = parse_date(value or "")
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _filter_orders(orders, params):
+    """
+    Apply the dashboard filters. Dates become half-open ``created_at`` ranges
+    rather than ``__date`` lookups so the ``created_at`` indexes are usable.
+    """
+    status = params.get("status", "")
+    if status in dict(Order.STATUS_CHOICES):
+        orders = orders.filter(status=status)
+
+    delivery = params.get("delivery", "")
+    if delivery == "none":
+        orders = orders.filter(assigned_delivery__isnull=True)
+    elif delivery.isdigit():
+        orders = orders.filter(assigned_delivery_id=int(delivery))
+
+    start = _day_start(params.get("date_from"))
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    end = _day_start(params.get("date_to"))
+    if end:
+        orders = orders.filter(created_at__lt=end + timedelta(days=1))
+    return orders
+
+
+def _filter_stats(params):
+    # same filters as _filter_orders, on the daily rollup (no per-user split)
+    rows = OrderDailyStat.objects.all()
+    status = params.get("status", "")
+    if status in dict(Order.STATUS_CHOICES):
+        rows = rows.filter(status=status)
+    date_from = parse_date(params.get("date_from") or "")
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+    date_to = parse_date(params.get("date_to") or "")
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+    return rows
+
 
 @admin_required
 def admin_dashboard(request):
-    orders = Order.objects.all().order_by("-created_at")
-    delivery_users = User.objects.filter(profile__role="delivery")
+    orders = _filter_orders(Order.objects.all(), request.GET)
+    delivery_users = User.objects.filter(profile__role="delivery").order_by("username")
+
+    paginator = Paginator(
+        orders.select_related("user", "assigned_delivery").order_by("-created_at", "-id"),
+        getattr(settings, "ADMIN_ORDERS_PER_PAGE", 50),
+    )
+
+    if request.GET.get("delivery"):
+        # one conditional aggregate instead of a COUNT per card
+        kpis = orders.aggregate(
+            total=Count("id"),
+            delivered=Count("id", filter=Q(status="delivered")),
+            pending=Count("id", filter=~Q(status="delivered")),
+        )
+        paginator.count = kpis["total"]  # already counted above
+    else:
+        # O(days): read the rollup instead of scanning orders; the paginator
+        # still counts the orders so drift can't hide rows
+        # (``manage.py rebuild_order_stats`` repairs the cards)
+        kpis = stats.summary(_filter_stats(request.GET))
+    page = paginator.get_page(request.GET.get("page"))
 
-    total = orders.count()
-    delivered = orders.filter(status="delivered").count()
-    pending = orders.exclude(status="delivered").count()
+    trend = stats.daily_trend(days=14)
+
+    query = request.GET.copy()
+    query.pop("page", None)
 
     return render(request, "admin/admin_dashboard.html", {
-        "orders": orders,
+        "orders": page.object_list,
+        "page": page,
+        "query": query.urlencode(),
+        "filters": request.GET,
+        "status_choices": Order.STATUS_CHOICES,
         "delivery_users": delivery_users,
-        "total": total,
-        "delivered": delivered,
-        "pending": pending,
+        "delivery_names": {d.id: d.username for d in delivery_users},
+        "live_stream": getattr(settings, "ORDER_EVENTS_STREAM", False),
+        "poll_seconds": getattr(settings, "ORDER_EVENTS_POLL_SECONDS", 30),
+        "total": kpis["total"],
+        "delivered": kpis["delivered"],
+        "pending": kpis["pending"],
+        "trend": trend,
+        "trend_max": max(d["orders"] for d in trend) or 1,
+        "status_totals": stats.status_totals(),
+        "stale_payment_hours": getattr(settings, "STALE_PAYMENT_HOURS", 24),
     })
 
 
+@admin_required
+def export_orders(request):
+    orders = _filter_orders(Order.objects.all(), request.GET)
+    stamp = timezone.localtime().strftime("%Y%m%d-%H%M")
+
+    if request.GET.get("format") == "ndjson":
+        response = StreamingHttpResponse(ndjson_rows(orders), content_type="application/x-ndjson")
+        filename = f"orders-{stamp}.ndjson"
+    else:
+        response = StreamingHttpResponse(csv_rows(orders), content_type="text/csv")
+        filename = f"orders-{stamp}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _back_to_dashboard(request):
+    # keep the admin on the same filtered page after an action
+    next_url = request.POST.get("next", "")
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect("adminapp:admin_dashboard")
+
+
 @admin_required
 def assign_delivery(request, order_id):
     order = Order.objects.get(id=order_id)
@@ -31,10 +149,74 @@ def assign_delivery(request, order_id):
     if request.method == "POST":
         delivery_id = request.POST.get("delivery_id")
         delivery_user = User.objects.get(id=delivery_id)
+        previous = order.assigned_delivery_id
         order.assigned_delivery = delivery_user
         order.save()
+        record_unassignments({order.pk: previous}, delivery_user.pk)
+        publish_orders([order], "assigned", {order.pk: previous})
+        return _back_to_dashboard(request)
+
+    return redirect("adminapp:admin_dashboard")
+
+
+@admin_required
+def bulk_assign_delivery(request):
+    if request.method != "POST":
+        return redirect("adminapp:admin_dashboard")
+
+    order_ids = [int(i) for i in request.POST.getlist("order_ids") if i.isdigit()]
+    delivery_user = User.objects.filter(
+        id=request.POST.get("delivery_id") or 0, profile__role="delivery"
+    ).first()
+    if not order_ids or delivery_user is None:
+        messages.error(request, "Select some orders and a delivery user.")
+        return _back_to_dashboard(request)
+
+    assigned = assign_orders(order_ids, delivery_user)
+    messages.success(request, f"Assigned {len(assigned)} orders to {delivery_user.username}.")
+    return _back_to_dashboard(request)
+
+
+@admin_required
+def auto_assign_delivery(request):
+    if request.method != "POST":
+        return redirect("adminapp:admin_dashboard")
+
+    limit = request.POST.get("limit", "").strip()
+    try:
+        limit = int(limit) if limit else None
+    except ValueError:
+        limit = -1
+    if limit is not None and limit < 0:
+        messages.error(request, "The limit must be a whole number of 0 or more.")
+        return _back_to_dashboard(request)
+
+    assigned = auto_assign(limit)
+    count = sum(len(ids) for ids in assigned.values())
+    if count:
+        messages.success(request, f"Auto-assigned {count} orders across {len(assigned)} delivery users.")
+    else:
+        messages.info(request, "No unassigned orders ready for delivery.")
+    return _back_to_dashboard(request)
+
+
+@admin_required
+def cancel_stale_orders(request):
+    if request.method != "POST":
         return redirect("adminapp:admin_dashboard")
 
+    try:
+        hours = max(1, int(request.POST.get("hours", "")))
+    except ValueError:
+        hours = None
+
+    # chunked so each transaction (and its write lock) stays short
+    ids = list(stale_unpaid_orders(hours).order_by("pk").values_list("pk", flat=True))
+    cancelled = 0
+    for start in range(0, len(ids), CANCEL_CHUNK_SIZE):
+        cancelled += len(cancel_orders(ids[start:start + CANCEL_CHUNK_SIZE]))
+
+    messages.success(request, f"Cancelled {cancelled} unpaid Razorpay orders.")
     return redirect("adminapp:admin_dashboard")
 
 
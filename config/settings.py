@@ -30,6 +30,16 @@ ALLOWED_HOSTS = ["*"]
 
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+
+# Dotted path of the gateway class; "core.payments.FakeGateway" needs no network
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "core.payments.RazorpayGateway")
+PAYMENT_GATEWAY_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+PAYMENT_GATEWAY_POOL_SIZE = 10
+PAYMENT_BREAKER_THRESHOLD = 5  # consecutive failures before failing fast
+PAYMENT_BREAKER_RESET = 30  # seconds before a trial request is let through
+# JSON file shared by processes using core.payments.FakeGateway (in memory if unset)
+PAYMENT_FAKE_STATE_FILE = os.getenv("PAYMENT_FAKE_STATE_FILE") or None
 
 # Application definition
 
@@ -85,6 +95,14 @@ DATABASES = {
     }
 }
 
+# Use a shared backend (Redis/Memcached) when running several processes so the
+# catalog version counter is shared too.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -117,10 +135,45 @@ USE_I18N = True
 USE_TZ = True
 
 LOGIN_URL = "core:login"
+
+# Catalog listing
+CATALOG_PAGE_SIZE = 24
+CATALOG_COUNT_CAP = 1000  # "1000+ results" beyond this
+SEARCH_MAX_RESULTS = 500
+CATALOG_CACHE_TIMEOUT = 300  # seconds; pages are also invalidated on any Medicine change
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_AGE = 300  # seconds before the in-process name index is rebuilt
+
+# Cart stock holds; run `manage.py sweep_reservations` periodically to prune
+CART_RESERVATION_MINUTES = 15
+
+# Queue checkouts as OrderIntent rows and place them from
+# `manage.py process_order_intents` instead of inside the request
+ORDER_INTAKE_ASYNC = False
+ORDER_INTAKE_BATCH_SIZE = 50
+ORDER_INTAKE_CLAIM_TIMEOUT = 120  # seconds before a crashed worker's batch is retried
+ORDER_INTAKE_MAX_ATTEMPTS = 3
+
+# Unpaid Razorpay orders older than this can be bulk-cancelled from the dashboard
+STALE_PAYMENT_HOURS = 24
+ADMIN_ORDERS_PER_PAGE = 50
+DELIVERY_HISTORY_PER_PAGE = 25
+DELIVERY_SYNC_PAGE_SIZE = 200
+DELIVERY_SYNC_RETENTION_DAYS = 30  # older sync cursors get a full snapshot
+DELIVERY_SYNC_SETTLE_SECONDS = 5  # see delivery.sync
+
+# Dashboards poll /events/orders/changes/ for updates. The server-sent event
+# stream needs the ASGI server with a single worker (see core.events).
+ORDER_EVENTS_STREAM = False
+ORDER_EVENTS_POLL_SECONDS = 30
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
 
 MEDIA_URL = "/media/"
-MEDIA_ROOT = os.path.join(BASE_DIR, "media")
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Widths (px) of the resized copies generated for Medicine.image
+MEDICINE_IMAGE_WIDTHS = (144, 320, 640)
\ No newline at end of file
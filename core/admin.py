@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Medicine, Order, OrderItem
-from .models import Profile
+from .orders import cancel_orders
+from .models import OrderIntent, PaymentEvent, Profile, StockReservation
  
 
 @admin.register(Medicine)
@@ -15,9 +16,17 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "status", "assigned_delivery", "created_at")
+    list_display = ("id", "user", "status", "total_amount", "item_count", "assigned_delivery", "created_at")
     list_filter = ("status",)
+    # these feed the OrderDailyStat rollup; change them through the dashboards
+    readonly_fields = ("status", "payment_method", "total_amount", "item_count")
     inlines = [OrderItemInline]
+    actions = ["cancel_selected"]
+
+    @admin.action(description="Cancel selected orders and restock items")
+    def cancel_selected(self, request, queryset):
+        cancelled = cancel_orders(list(queryset.values_list("pk", flat=True)))
+        self.message_user(request, f"Cancelled {len(cancelled)} orders.")
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -25,3 +34,22 @@ class ProfileAdmin(admin.ModelAdmin):
     list_filter = ("role",)
     search_fields = ("user__username", "phone")
 
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("medicine", "qty", "cart_token", "expires_at")
+    list_select_related = ("medicine",)
+
+
+@admin.register(OrderIntent)
+class OrderIntentAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "attempts", "order", "created_at", "claimed_at")
+    list_filter = ("status",)
+    list_select_related = ("user", "order")
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "event", "razorpay_order_id", "received_at", "processed_at", "error")
+    list_filter = ("event",)
+    search_fields = ("event_id", "razorpay_order_id")
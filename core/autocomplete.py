@@ -0,0 +1,121 @@
+"""
+In-process typeahead index for medicine names.
+
+Names of active medicines are kept in a sorted list of ``(key, id)`` pairs,
+one per word start ("vitamin d3 tablets", "d3 tablets", "tablets"), so a
+lookup is a ``bisect`` plus a short scan and never touches the database.
+The index is built lazily, patched in place from the ``Medicine`` signals,
+and rebuilt after ``AUTOCOMPLETE_MAX_AGE`` seconds to pick up changes made
+by other processes.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Medicine
+
+
+def _fold(text):
+    return " ".join(text.lower().split())
+
+
+def _keys_for(name):
+    words = _fold(name).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._names = {}
+        self.built_at = None
+
+    def build(self, rows):
+        keys = []
+        names = {}
+        for pk, name in rows:
+            names[pk] = name
+            keys.extend((key, pk) for key in _keys_for(name))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = names
+            self.built_at = time.monotonic()
+
+    def _remove_locked(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        for key in _keys_for(name):
+            i = bisect.bisect_left(self._keys, (key, pk))
+            if i < len(self._keys) and self._keys[i] == (key, pk):
+                del self._keys[i]
+
+    def upsert(self, pk, name):
+        with self._lock:
+            self._remove_locked(pk)
+            self._names[pk] = name
+            for key in _keys_for(name):
+                bisect.insort(self._keys, (key, pk))
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove_locked(pk)
+
+    def lookup(self, prefix, limit=10):
+        prefix = _fold(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, pk = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self._names[pk]))
+                i += 1
+        return results
+
+
+_index = PrefixIndex()
+_build_lock = threading.Lock()
+
+
+def _is_stale():
+    max_age = getattr(settings, "AUTOCOMPLETE_MAX_AGE", 300)
+    return _index.built_at is None or time.monotonic() - _index.built_at > max_age
+
+
+def rebuild():
+    rows = Medicine.objects.filter(is_active=True).values_list("id", "name")
+    _index.build(rows.iterator(chunk_size=2000))
+
+
+def suggest(prefix, limit=10):
+    """Return up to ``limit`` ``(id, name)`` pairs whose name has a word starting with ``prefix``."""
+    if _is_stale():
+        with _build_lock:
+            if _is_stale():
+                rebuild()
+    return _index.lookup(prefix, limit)
+
+
+def medicine_changed(medicine):
+    if _index.built_at is None:
+        return
+    if medicine.is_active:
+        _index.upsert(medicine.pk, medicine.name)
+    else:
+        _index.remove(medicine.pk)
+
+
+def medicine_removed(pk):
+    if _index.built_at is not None:
+        _index.remove(pk)
@@ -0,0 +1,79 @@
+"""
+Cheap validators for Django's ``condition`` decorator.
+
+Each function answers from the catalog version counter or a single indexed
+aggregate, so an unchanged page can be answered with 304 Not Modified
+before the view queries or renders anything. Pages carry per-user
+fragments and a CSRF token, so the user and CSRF cookie are part of every
+ETag. Returning ``None`` (e.g. while flash messages are waiting) turns
+conditional handling off for that request.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Order
+from .page_cache import get_catalog_version
+from .utils import has_pending_messages
+
+
+def _etag(*parts):
+    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _client_parts(request):
+    return (request.user.pk or "anon", request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""))
+
+
+def catalog_etag(request, *args, **kwargs):
+    if has_pending_messages(request):
+        return None
+    return _etag(get_catalog_version(), request.get_full_path(), *_client_parts(request))
+
+
+def _my_orders_state(request):
+    if not hasattr(request, "_my_orders_state"):
+        request._my_orders_state = Order.objects.filter(user=request.user).aggregate(
+            last=Max("updated_at"), count=Count("id")
+        )
+    return request._my_orders_state
+
+
+def my_orders_etag(request):
+    if has_pending_messages(request):
+        return None
+    state = _my_orders_state(request)
+    return _etag(state["count"], state["last"], *_client_parts(request))
+
+
+def my_orders_last_modified(request):
+    if has_pending_messages(request):
+        return None
+    return _my_orders_state(request)["last"]
+
+
+def _order_updated_at(request, order_id):
+    if not hasattr(request, "_order_updated_at"):
+        request._order_updated_at = (
+            Order.objects.filter(id=order_id, user=request.user)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+    return request._order_updated_at
+
+
+def order_etag(request, order_id):
+    if has_pending_messages(request):
+        return None
+    updated_at = _order_updated_at(request, order_id)
+    if updated_at is None:
+        return None
+    # item rows show medicine names and images, so the catalog version counts too
+    return _etag(order_id, updated_at, get_catalog_version(), *_client_parts(request))
+
+
+def order_last_modified(request, order_id):
+    if has_pending_messages(request):
+        return None
+    return _order_updated_at(request, order_id)
@@ -0,0 +1,99 @@
+"""
+In-process broadcast of order changes for the live dashboards.
+
+Code that creates, assigns or moves orders calls ``publish_orders()``; once
+the transaction commits, one compact event per order is fanned out to every
+open ``/events/orders/`` stream in this process. Each stream owns a bounded
+``asyncio.Queue`` on the ASGI event loop, and publishers (sync views running
+in worker threads) hand events over with ``call_soon_threadsafe``. A stream
+that falls too far behind is told to ``resync`` (reload) instead of blocking
+publishers.
+
+The hub is per process and only sees changes made in the same process:
+a management command, a second worker or a WSGI server publishing an event
+reaches nobody. The stream is therefore opt-in (``ORDER_EVENTS_STREAM``)
+and only complete when the whole site runs as one ASGI process. By default
+dashboards poll ``/events/orders/changes/`` instead, which reads the
+database and so sees every process's writes.
+"""
+import asyncio
+import threading
+
+from django.db import transaction
+
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, accepts, loop):
+        self.accepts = accepts
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event):
+        # runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, accepts=None):
+        """Register the calling coroutine's stream; ``accepts(event)`` filters what it receives."""
+        sub = Subscription(accepts or (lambda event: True), asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.accepts(event):
+                try:
+                    sub.loop.call_soon_threadsafe(sub.push, event)
+                except RuntimeError:
+                    # loop already closed; the stream is going away
+                    self.unsubscribe(sub)
+
+
+hub = Hub()
+
+
+def order_event(order, kind, previous_delivery_id=None):
+    return {
+        "kind": kind,  # "created", "assigned" or "status"
+        "id": order.pk,
+        "status": order.status,
+        "paid": order.is_paid,
+        "total": str(order.total_amount),
+        "delivery_id": order.assigned_delivery_id,
+        "previous_delivery_id": previous_delivery_id,
+    }
+
+
+def publish_orders(orders, kind, previous_delivery_ids=None):
+    """
+    Queue one event per order for after the current transaction commits.
+    ``orders`` must already hold their new state.
+    """
+    previous = previous_delivery_ids or {}
+    events = [order_event(o, kind, previous.get(o.pk)) for o in orders]
+    if not events:
+        return
+
+    def send():
+        for event in events:
+            hub.publish(event)
+
+    transaction.on_commit(send)
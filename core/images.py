@@ -0,0 +1,132 @@
+"""
+Resized and re-encoded derivatives of ``Medicine.image``.
+
+Each uploaded image gets a few fixed widths in JPEG plus WebP (and AVIF when
+Pillow was built with it) under ``medicines/variants/``. The generated paths
+are stored on ``Medicine.image_variants`` so templates can build ``srcset``
+attributes without touching the filesystem.
+
+Encoding runs in ``manage.py generate_image_variants`` (once, or with
+``--watch`` as a worker), never in a request: saving a new image only
+clears the stale variants, and pages show the original upload until the
+command has caught up.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+VARIANT_DIR = "medicines/variants"
+
+# format name -> (Pillow format, extension, save options)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", {"quality": 78, "method": 5}),
+    "avif": ("AVIF", "avif", {"quality": 60}),
+}
+
+
+def variant_widths():
+    return tuple(getattr(settings, "MEDICINE_IMAGE_WIDTHS", (144, 320, 640)))
+
+
+def available_formats():
+    formats = ["jpeg", "webp"]
+    if features.check("avif"):
+        formats.append("avif")
+    return formats
+
+
+def _open_rgb(name):
+    with default_storage.open(name, "rb") as fh:
+        img = Image.open(fh)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        img.load()
+    return img
+
+
+def _flatten(img):
+    # JPEG has no alpha channel; composite onto white like the page background
+    if img.mode != "RGBA":
+        return img
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A"))
+    return background
+
+
+def generate_variants(name):
+    """
+    Write every width/format derivative of the stored image ``name`` and
+    return the ``image_variants`` mapping describing them. Only plain values
+    go in and out so this can run in a worker process.
+    """
+    source = _open_rgb(name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {"source": name}
+
+    for fmt in available_formats():
+        pil_format, ext, options = FORMATS[fmt]
+        paths = {}
+        for width in variant_widths():
+            # never upscale; small originals just get re-encoded
+            if source.width > width:
+                height = round(source.height * width / source.width)
+                resized = source.resize((width, height), Image.LANCZOS)
+            else:
+                resized = source
+            if pil_format == "JPEG":
+                resized = _flatten(resized)
+
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+
+            path = f"{VARIANT_DIR}/{stem}-{width}.{ext}"
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            paths[str(width)] = default_storage.save(path, ContentFile(buffer.getvalue()))
+        variants[fmt] = paths
+
+    return variants
+
+
+def variants_current(medicine):
+    if not medicine.image:
+        return not medicine.image_variants
+    return (medicine.image_variants or {}).get("source") == medicine.image.name
+
+
+def variant_paths(variants):
+    """Every stored file listed in an ``image_variants`` mapping."""
+    return {
+        path
+        for fmt, paths in (variants or {}).items()
+        if fmt != "source" and isinstance(paths, dict)
+        for path in paths.values()
+    }
+
+
+def delete_variants(paths):
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except OSError:
+            # already gone, or storage is read-only; not worth failing over
+            pass
+
+
+def clear_variants(medicine):
+    """
+    Forget ``medicine``'s variants without firing signals and return the
+    paths of the old files, for the caller to delete once that is safe.
+    """
+    from .models import Medicine
+
+    old = variant_paths(medicine.image_variants)
+    Medicine.objects.filter(pk=medicine.pk).update(image_variants={})
+    medicine.image_variants = {}
+    return old
@@ -0,0 +1,192 @@
+"""
+Asynchronous order intake.
+
+With ``ORDER_INTAKE_ASYNC`` on, checkout only validates the form and appends
+an ``OrderIntent`` row; ``manage.py process_order_intents`` runs a pool of
+worker threads that claim pending intents in batches and place them with
+``core.orders.place_order``. Each batch commits once, with a savepoint per
+intent, so a burst of checkouts turns into a few write transactions instead
+of one per request. An intent that errors is rolled back to its savepoint
+and retried on its own; ``attempts`` counts only that intent's failures
+(and reclaims after its worker died), so one bad intent never uses up the
+retries of the others in its batch.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from . import reservations
+from .models import Medicine, OrderIntent
+from .orders import OutOfStock, place_order
+from .pricing import CartLine
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, "ORDER_INTAKE_ASYNC", False)
+
+
+def enqueue(user, cart, *, cart_token, idempotency_key, full_name, phone, address, payment_method):
+    """Queue a checkout; a replayed ``idempotency_key`` returns the intent already queued."""
+    payload = {
+        "lines": [[int(mid), line["qty"]] for mid, line in cart.items()],
+        "full_name": full_name,
+        "phone": phone,
+        "address": address,
+        "payment_method": payment_method,
+    }
+    try:
+        with transaction.atomic():
+            return OrderIntent.objects.create(
+                user=user, idempotency_key=idempotency_key, cart_token=cart_token, payload=payload
+            )
+    except IntegrityError:
+        return OrderIntent.objects.get(user=user, idempotency_key=idempotency_key)
+
+
+def _claimable(now):
+    timeout = timedelta(seconds=getattr(settings, "ORDER_INTAKE_CLAIM_TIMEOUT", 120))
+    # "processing" rows older than the timeout belong to a worker that died
+    return Q(status="pending") | Q(status="processing", claimed_at__lt=now - timeout)
+
+
+def claim_batch(size):
+    """Mark up to ``size`` intents as ours and return them, oldest first."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        candidates = OrderIntent.objects.filter(_claimable(now)).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("id", flat=True)[:size])
+        if not ids:
+            return []
+        # re-check the condition so a concurrent worker's claim wins cleanly;
+        # a stale "processing" row counts as a failed attempt of that intent
+        OrderIntent.objects.filter(_claimable(now), id__in=ids).update(
+            status="processing",
+            claimed_at=now,
+            claimed_by=token,
+            attempts=F("attempts") + Case(When(status="processing", then=1), default=0),
+        )
+    return list(
+        OrderIntent.objects.filter(claimed_by=token, status="processing").select_related("user").order_by("id")
+    )
+
+
+def release_batch(intents):
+    """Hand a claimed batch back to the queue without charging an attempt."""
+    OrderIntent.objects.filter(
+        id__in=[intent.id for intent in intents], claimed_by=intents[0].claimed_by, status="processing"
+    ).update(status="pending", claimed_by="")
+
+
+def _place(intent, meds):
+    data = intent.payload
+    lines = [
+        CartLine(medicine=meds[mid], qty=qty)
+        for mid, qty in data["lines"]
+        if mid in meds and meds[mid].is_active
+    ]
+    if not lines:
+        return None
+    return place_order(
+        intent.user,
+        lines,
+        full_name=data["full_name"],
+        phone=data["phone"],
+        address=data["address"],
+        payment_method=data["payment_method"],
+        idempotency_key=intent.idempotency_key,
+    )
+
+
+def process_batch(intents):
+    """
+    Place every intent in ``intents`` inside one transaction, each in its own
+    savepoint. Out-of-stock intents are marked failed; an intent that raises
+    anything else goes back to pending until it has failed
+    ``ORDER_INTAKE_MAX_ATTEMPTS`` times.
+    """
+    max_attempts = getattr(settings, "ORDER_INTAKE_MAX_ATTEMPTS", 3)
+    med_ids = {
+        line[0] for intent in intents for line in intent.payload.get("lines", [])
+        if isinstance(line, list) and line
+    }
+    meds = Medicine.objects.in_bulk([mid for mid in med_ids if isinstance(mid, int)])
+
+    placed = []
+    with transaction.atomic():
+        for intent in intents:
+            if intent.attempts >= max_attempts:
+                intent.status = "failed"
+                intent.error = "We could not place this order. Please try again."
+                continue
+            try:
+                with transaction.atomic():
+                    intent.order = _place(intent, meds)
+            except OutOfStock as exc:
+                intent.status = "failed"
+                intent.error = "Not enough stock left for: " + ", ".join(exc.names) + ". Please update your cart."
+                continue
+            except Exception:
+                logger.exception("Order intent %s failed", intent.pk)
+                intent.order = None
+                intent.attempts += 1
+                if intent.attempts >= max_attempts:
+                    intent.status = "failed"
+                    intent.error = "We could not place this order. Please try again."
+                else:
+                    intent.status = "pending"
+                continue
+            if intent.order is None:
+                intent.status = "failed"
+                intent.error = "The items in your cart are no longer available."
+            else:
+                intent.status = "done"
+                placed.append(intent)
+
+        OrderIntent.objects.bulk_update(intents, ["status", "order", "error", "attempts"])
+        tokens = [intent.cart_token for intent in placed if intent.cart_token]
+        if tokens:
+            reservations.release(*tokens)
+    return len(placed)
+
+
+def run_worker(stop, batch_size=None, poll_interval=1.0, drain=False):
+    """
+    Claim and process batches until ``stop`` (a ``threading.Event``) is set,
+    or, with ``drain``, until the queue is empty.
+    """
+    batch_size = batch_size or getattr(settings, "ORDER_INTAKE_BATCH_SIZE", 50)
+    processed = 0
+    try:
+        while not stop.is_set():
+            intents = claim_batch(batch_size)
+            if not intents:
+                if drain:
+                    break
+                stop.wait(poll_interval)
+                continue
+            try:
+                process_batch(intents)
+            except Exception:
+                logger.exception("Order intake batch of %d intents failed", len(intents))
+                try:
+                    release_batch(intents)
+                except Exception:
+                    # left for the claim timeout to pick up
+                    logger.exception("Could not release order intake batch")
+                stop.wait(poll_interval)
+                continue
+            processed += len(intents)
+    finally:
+        # each worker thread has its own connection
+        connection.close()
+    return processed
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Order
+from core.orders import refresh_totals
+
+
+class Command(BaseCommand):
+    help = "Fill in Order.total_amount and Order.item_count from order items, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Orders updated per batch.")
+        parser.add_argument("--all", action="store_true", help="Recompute every order, not just empty ones.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        orders = Order.objects.order_by("pk")
+        if not options["all"]:
+            orders = orders.filter(item_count=0)
+
+        done = 0
+        last_pk = 0
+        while True:
+            ids = list(orders.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                break
+            refresh_totals(ids)
+            done += len(ids)
+            last_pk = ids[-1]
+            self.stdout.write(f"Updated {done} orders...")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled totals for {done} orders."))
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Medicine
+from core.page_cache import bump_catalog_version
+
+
+def _init_worker():
+    # needed when the pool uses the "spawn" start method (macOS, Windows)
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail/WebP/AVIF variants for medicine images in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows written per bulk_update.")
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that are already current.")
+        parser.add_argument(
+            "--watch", type=float, default=None, metavar="SECONDS",
+            help="Keep running, checking for new images every SECONDS.",
+        )
+
+    def handle(self, *args, **options):
+        if options["watch"] is None:
+            self.generate(options)
+            return
+        try:
+            while True:
+                self.generate(options, quiet=True)
+                time.sleep(options["watch"])
+        except KeyboardInterrupt:
+            pass
+
+    def generate(self, options, quiet=False):
+        batch_size = options["batch_size"]
+        todo = {}
+        old = {}
+        medicines = (
+            Medicine.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .only("id", "image", "image_variants")
+        )
+        for med in medicines.iterator(chunk_size=2000):
+            if options["force"] or not images.variants_current(med):
+                todo[med.id] = med.image.name
+                old[med.id] = images.variant_paths(med.image_variants)
+
+        if not todo:
+            if not quiet:
+                self.stdout.write("All image variants are up to date.")
+            return
+
+        self.stdout.write(f"Generating variants for {len(todo)} images...")
+        started = time.monotonic()
+        pending = []
+        done = failed = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+            futures = {pool.submit(images.generate_variants, name): pk for pk, name in todo.items()}
+            for future in as_completed(futures):
+                pk = futures[future]
+                try:
+                    variants = future.result()
+                except OSError as exc:
+                    failed += 1
+                    self.stderr.write(f"Medicine {pk}: {exc}")
+                    continue
+                pending.append(Medicine(id=pk, image_variants=variants))
+                # files for widths/formats no longer configured
+                images.delete_variants(old[pk] - images.variant_paths(variants))
+                if len(pending) >= batch_size:
+                    done += len(pending)
+                    Medicine.objects.bulk_update(pending, ["image_variants"])
+                    pending = []
+
+        if pending:
+            done += len(pending)
+            Medicine.objects.bulk_update(pending, ["image_variants"])
+
+        if done:
+            bump_catalog_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {done} images in {elapsed:.1f}s ({failed} failed)."
+        ))
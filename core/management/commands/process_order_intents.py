@@ -0,0 +1,45 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core import intake
+
+
+class Command(BaseCommand):
+    help = "Place queued checkouts (OrderIntent rows) with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker threads.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Intents claimed per transaction.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        counts = []
+
+        def work():
+            counts.append(
+                intake.run_worker(
+                    stop,
+                    batch_size=options["batch_size"],
+                    poll_interval=options["poll_interval"],
+                    drain=options["drain"],
+                )
+            )
+
+        threads = [threading.Thread(target=work, name=f"intake-{i}") for i in range(max(1, options["workers"]))]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                # join with a timeout so Ctrl-C is noticed
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers...")
+            stop.set()
+            for t in threads:
+                t.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {sum(counts)} order intents."))
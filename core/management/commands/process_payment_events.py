@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import webhooks
+
+
+class Command(BaseCommand):
+    help = "Apply stored Razorpay webhook events to orders in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Events applied per transaction.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the inbox is empty.")
+        parser.add_argument("--drain", action="store_true", help="Exit once the inbox is empty.")
+
+    def handle(self, *args, **options):
+        handled = 0
+        try:
+            while True:
+                n = webhooks.process_pending(batch_size=options["batch_size"])
+                handled += n
+                if n:
+                    continue
+                if options["drain"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {handled} payment events."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.orders import prune_unassignments
+
+
+class Command(BaseCommand):
+    help = "Delete order unassignment notes older than the delivery sync retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Defaults to DELIVERY_SYNC_RETENTION_DAYS.")
+
+    def handle(self, *args, **options):
+        removed = prune_unassignments(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} unassignment notes."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the OrderDailyStat rollup from all orders."
+
+    def handle(self, *args, **options):
+        rows = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily stat rows."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the medicine full-text search index from the Medicine table."
+
+    def handle(self, *args, **options):
+        count = search.rebuild_index()
+        if count is None:
+            self.stdout.write("This database maintains its own search index; nothing to rebuild.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} medicines."))
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Order
+from core.payments import GatewayError, RateLimiter, get_gateway
+from core.pricing import to_paise
+
+
+class Command(BaseCommand):
+    help = "Ask the payment gateway about unpaid Razorpay orders and mark the paid ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent gateway requests.")
+        parser.add_argument("--rate", type=float, default=20, help="Max gateway requests per second (0 = no limit).")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Orders fetched and updated per batch.")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many orders.")
+        parser.add_argument("--dry-run", action="store_true", help="Report without updating orders.")
+
+    def handle(self, *args, **options):
+        gateway = get_gateway()
+        limiter = RateLimiter(options["rate"])
+        chunk_size = options["chunk_size"]
+
+        orders = (
+            Order.objects.filter(payment_method="razorpay", is_paid=False, razorpay_order_id__isnull=False)
+            .exclude(razorpay_order_id="")
+            .only("id", "razorpay_order_id", "total_amount")
+            .order_by("id")
+        )
+        if options["limit"]:
+            orders = orders[: options["limit"]]
+
+        def check(order):
+            limiter.wait()
+            try:
+                return order, gateway.fetch_order(order.razorpay_order_id), None
+            except GatewayError as exc:
+                return order, None, str(exc)
+
+        self.checked = self.paid = self.errors = 0
+        started = time.monotonic()
+        chunk = []
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for order in orders.iterator(chunk_size=chunk_size):
+                chunk.append(order)
+                if len(chunk) >= chunk_size:
+                    self._apply(pool.map(check, chunk), options["dry_run"])
+                    chunk = []
+            if chunk:
+                self._apply(pool.map(check, chunk), options["dry_run"])
+
+        elapsed = time.monotonic() - started
+        rate = self.checked / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {self.checked} orders in {elapsed:.1f}s ({rate:.1f}/s): "
+                f"{self.paid} paid, {self.errors} errors."
+            )
+        )
+
+    def _apply(self, results, dry_run):
+        paid = []
+        for order, remote, error in results:
+            self.checked += 1
+            if error:
+                self.errors += 1
+                self.stderr.write(f"Order #{order.id} ({order.razorpay_order_id}): {error}")
+                continue
+            if remote["status"] != "paid":
+                continue
+            if remote["amount_paid"] != to_paise(order.total_amount):
+                self.errors += 1
+                self.stderr.write(
+                    f"Order #{order.id}: gateway paid {remote['amount_paid']} paise, "
+                    f"expected {to_paise(order.total_amount)}"
+                )
+                continue
+            order.is_paid = True
+            order.razorpay_payment_id = remote["payment_id"]
+            paid.append(order)
+
+        self.paid += len(paid)
+        if paid and not dry_run:
+            # stamped after the gateway calls, right before the write (see delivery.sync)
+            now = timezone.now()
+            for order in paid:
+                order.updated_at = now
+            Order.objects.bulk_update(paid, ["is_paid", "razorpay_payment_id", "updated_at"])
+        self.stdout.write(f"{self.checked} checked, {self.paid} paid so far")
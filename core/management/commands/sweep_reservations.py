@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired cart stock reservations in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        removed = reservations.sweep_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired reservations."))
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS core_medicine_fts USING fts5("
+                "name, brand, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(
+                "INSERT INTO core_medicine_fts (rowid, name, brand, description) "
+                "SELECT id, name, brand, description FROM core_medicine WHERE is_active"
+            )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS core_medicine_search_idx ON core_medicine "
+            "USING GIN (to_tsvector('simple', coalesce(name, '') || ' ' || "
+            "coalesce(brand, '') || ' ' || coalesce(description, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS core_medicine_fts")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS core_medicine_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_order_is_paid_order_payment_method_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
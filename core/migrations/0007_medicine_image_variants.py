@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_medicine_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
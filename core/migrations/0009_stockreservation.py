@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_token', models.CharField(max_length=32)),
+                ('qty', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.medicine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medicine', 'expires_at'], name='core_stockr_medicin_e3ff55_idx'), models.Index(fields=['expires_at'], name='core_stockr_expires_3f11d8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cart_token', 'medicine'), name='unique_cart_reservation')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_order_daily_stat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_delivery', 'status', 'created_at'], name='core_order_assigne_2c88f1_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_order_delivery_status_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderUnassignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_delivery', 'updated_at'], name='core_order_assigne_da41bc_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderunassignment',
+            name='delivery_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderunassignment',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.order'),
+        ),
+        migrations.AddIndex(
+            model_name='orderunassignment',
+            index=models.Index(fields=['delivery_user', 'created_at'], name='core_orderu_deliver_d32910_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:20
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def rebuild_stats(apps, schema_editor):
+    # same as core.stats.rebuild, against the historical models
+    Order = apps.get_model("core", "Order")
+    OrderDailyStat = apps.get_model("core", "OrderDailyStat")
+    rows = (
+        Order.objects.annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+        .values("day", "status", "payment_method")
+        .annotate(order_count=Count("id"), amount=Sum("total_amount"))
+        .order_by()
+    )
+    OrderDailyStat.objects.all().delete()
+    OrderDailyStat.objects.bulk_create([OrderDailyStat(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_order_delivery_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_payment_event_retries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='core_order_updated_1fb29b_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:05
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+CHUNK_SIZE = 1000
+
+
+def backfill_totals(apps, schema_editor):
+    # orders placed before totals were stored; the views now only read them
+    Order = apps.get_model("core", "Order")
+    OrderItem = apps.get_model("core", "OrderItem")
+    OrderDailyStat = apps.get_model("core", "OrderDailyStat")
+    line_total = ExpressionWrapper(F("qty") * F("price"), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    now = timezone.now()
+    last_pk = 0
+    changed = False
+    while True:
+        ids = list(
+            Order.objects.filter(item_count=0, pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:CHUNK_SIZE]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        rows = (
+            OrderItem.objects.filter(order_id__in=ids)
+            .values("order_id")
+            .annotate(total=Sum(line_total), count=Sum("qty"))
+            .order_by()
+        )
+        orders = [
+            Order(
+                id=r["order_id"],
+                total_amount=Decimal(r["total"]).quantize(Decimal("0.01")),
+                item_count=r["count"],
+                updated_at=now,
+            )
+            for r in rows
+        ]
+        Order.objects.bulk_update(orders, ["total_amount", "item_count", "updated_at"])
+        changed = changed or bool(orders)
+
+    if not changed:
+        return
+    # amounts moved: rebuild the rollup as in 0018
+    rows = (
+        Order.objects.annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+        .values("day", "status", "payment_method")
+        .annotate(order_count=Count("id"), amount=Sum("total_amount"))
+        .order_by()
+    )
+    OrderDailyStat.objects.all().delete()
+    OrderDailyStat.objects.bulk_create([OrderDailyStat(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_order_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
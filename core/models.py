@@ -1,3 +1,4 @@
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth.models import User
 from django.dispatch import receiver
@@ -11,11 +12,60 @@ class Medicine(models.Model):
     stock = models.PositiveIntegerField(default=0)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="medicines/", blank=True, null=True)
+    # resized JPEG/WebP/AVIF copies of ``image``, written by core.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
         return self.name
 
+    def _srcset(self, fmt):
+        paths = (self.image_variants or {}).get(fmt) or {}
+        return ", ".join(
+            f"{default_storage.url(path)} {width}w"
+            for width, path in sorted(paths.items(), key=lambda kv: int(kv[0]))
+        )
+
+    @property
+    def avif_srcset(self):
+        return self._srcset("avif")
+
+    @property
+    def webp_srcset(self):
+        return self._srcset("webp")
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset("jpeg")
+
+    @property
+    def thumbnail_url(self):
+        paths = (self.image_variants or {}).get("jpeg") or {}
+        if paths:
+            smallest = min(paths, key=int)
+            return default_storage.url(paths[smallest])
+        return self.image.url if self.image else ""
+
+
+class StockReservation(models.Model):
+    # short hold a cart places on stock; see core.reservations
+    cart_token = models.CharField(max_length=32)
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="reservations")
+    qty = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart_token", "medicine"], name="unique_cart_reservation"),
+        ]
+        indexes = [
+            models.Index(fields=["medicine", "expires_at"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine_id} x {self.qty} until {self.expires_at:%H:%M}"
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -32,6 +82,8 @@ class Order(models.Model):
     address = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="placed")
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every save; bulk .update() calls must set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
     assigned_delivery = models.ForeignKey(
                         User,
                         on_delete=models.SET_NULL,
@@ -46,14 +98,125 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default="cod")
     is_paid = models.BooleanField(default=False)
 
+    # denormalized from the items at checkout; see core.orders.refresh_totals
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_signature = models.CharField(max_length=255, blank=True, null=True)
 
+    # client-generated token from the checkout form; replays return this order
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "idempotency_key"], name="unique_order_idempotency_key"),
+        ]
+        # admin dashboard filters (status / delivery user / date range), the
+        # delivery dashboard's active/history lists, newest first, and the
+        # delivery app's delta sync
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["assigned_delivery", "created_at"]),
+            models.Index(fields=["assigned_delivery", "status", "created_at"]),
+            models.Index(fields=["assigned_delivery", "updated_at"]),
+            models.Index(fields=["updated_at"]),  # dashboard polling
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
 
+class OrderUnassignment(models.Model):
+    # an order taken off a delivery user's list; see delivery.sync
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="+")
+    delivery_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["delivery_user", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} left user {self.delivery_user_id}"
+
+
+class OrderIntent(models.Model):
+    # checkout queued for a worker when ORDER_INTAKE_ASYNC is on; see core.intake
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=64)
+    cart_token = models.CharField(max_length=32, blank=True)
+    # {"lines": [[medicine_id, qty], ...], "full_name": ..., "phone": ..., "address": ..., "payment_method": ...}
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "idempotency_key"], name="unique_intent_idempotency_key"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Intent #{self.id} ({self.status})"
+
+
+class PaymentEvent(models.Model):
+    # raw Razorpay webhook deliveries, applied in batches by core.webhooks
+    event_id = models.CharField(max_length=64, unique=True)
+    event = models.CharField(max_length=64)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # events for orders not found yet are retried; see core.webhooks
+    attempts = models.PositiveIntegerField(default=0)
+    retry_after = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["processed_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
+
+
+class OrderDailyStat(models.Model):
+    # per-day rollup of orders by creation day; maintained by core.stats
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_CHOICES)
+    order_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status", "payment_method"], name="unique_order_daily_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}/{self.payment_method}: {self.order_count}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     medicine = models.ForeignKey(Medicine, on_delete=models.PROTECT)
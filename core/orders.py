@@ -0,0 +1,244 @@
+"""
+Order placement and stock bookkeeping.
+
+Everything that creates orders or moves stock goes through here so the
+writes stay set-based: order items are inserted with one ``bulk_create`` and
+stock is decremented with one conditional ``UPDATE`` per batch of SKUs.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import events, stats
+from .models import Medicine, Order, OrderItem, OrderUnassignment
+from .page_cache import bump_catalog_version
+from .pricing import ZERO, order_totals
+
+STOCK_BATCH_SIZE = 500
+
+# orders past these can no longer be cancelled
+UNCANCELLABLE_STATUSES = ("shipped", "delivered", "cancelled")
+
+
+class OutOfStock(Exception):
+    def __init__(self, medicine_ids, names=()):
+        self.medicine_ids = list(medicine_ids)
+        self.names = list(names)
+        super().__init__(f"Not enough stock for: {', '.join(self.names) or self.medicine_ids}")
+
+
+def _qty_case(quantities):
+    return Case(
+        *[When(pk=mid, then=Value(qty)) for mid, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def decrement_stock(quantities):
+    """
+    Take ``{medicine_id: qty}`` out of stock with
+    ``UPDATE ... SET stock = stock - qty WHERE id IN (...) AND stock >= qty``
+    per batch. Must run inside a transaction; raises ``OutOfStock`` (so the
+    caller rolls back) if any line could not be fulfilled.
+    """
+    items = list(quantities.items())
+    short = []
+    for start in range(0, len(items), STOCK_BATCH_SIZE):
+        batch = dict(items[start:start + STOCK_BATCH_SIZE])
+        qty = _qty_case(batch)
+        updated = Medicine.objects.filter(pk__in=batch.keys(), stock__gte=qty).update(
+            stock=F("stock") - qty
+        )
+        if updated != len(batch):
+            short.extend(batch)
+    if short:
+        raise OutOfStock(short)
+
+
+def restore_stock(quantities):
+    """
+    Put ``{medicine_id: qty}`` back with
+    ``UPDATE ... SET stock = stock + CASE id WHEN ... END`` per batch.
+    """
+    items = list(quantities.items())
+    for start in range(0, len(items), STOCK_BATCH_SIZE):
+        batch = dict(items[start:start + STOCK_BATCH_SIZE])
+        Medicine.objects.filter(pk__in=batch.keys()).update(stock=F("stock") + _qty_case(batch))
+
+
+def cancel_orders(order_ids):
+    """
+    Cancel every order in ``order_ids`` that hasn't shipped yet and restock
+    its items, using one status ``UPDATE``, one grouped read of the items and
+    one stock ``UPDATE`` per batch. Returns the ids actually cancelled.
+    """
+    with transaction.atomic():
+        # lock the rows so a concurrent cancel can't restock the same order twice
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .exclude(status__in=UNCANCELLABLE_STATUSES)
+            .only(
+                "pk", "status", "payment_method", "created_at", "total_amount", "item_count",
+                "is_paid", "assigned_delivery",
+            )
+        )
+        if not orders:
+            return []
+
+        # placed before totals were stored: fill them in so the rollup moves the real amount
+        legacy = [o.pk for o in orders if not o.item_count]
+        if legacy:
+            totals = refresh_totals(legacy)
+            for o in orders:
+                if o.pk in totals:
+                    o.total_amount, o.item_count = totals[o.pk]
+
+        ids = [o.pk for o in orders]
+        Order.objects.filter(pk__in=ids).update(status="cancelled", updated_at=timezone.now())
+        stats.record_transition(orders, "cancelled")
+        for o in orders:
+            o.status = "cancelled"
+        events.publish_orders(orders, "status")
+        rows = (
+            OrderItem.objects.filter(order_id__in=ids)
+            .values("medicine_id")
+            .annotate(qty=Sum("qty"))
+            .order_by()
+        )
+        restore_stock({row["medicine_id"]: row["qty"] for row in rows})
+        transaction.on_commit(bump_catalog_version)
+    return ids
+
+
+def stale_unpaid_orders(hours=None):
+    """Razorpay orders still unpaid and unshipped ``hours`` after they were placed."""
+    if hours is None:
+        hours = getattr(settings, "STALE_PAYMENT_HOURS", 24)
+    return Order.objects.filter(
+        payment_method="razorpay",
+        is_paid=False,
+        created_at__lt=timezone.now() - timedelta(hours=hours),
+    ).exclude(status__in=UNCANCELLABLE_STATUSES)
+
+
+def record_unassignments(previous_delivery_ids, new_delivery_id):
+    """
+    Note every order in ``{order_id: previous delivery user id}`` that is
+    leaving its delivery user, so their next delta sync drops it.
+    """
+    OrderUnassignment.objects.bulk_create([
+        OrderUnassignment(order_id=order_id, delivery_user_id=old)
+        for order_id, old in previous_delivery_ids.items()
+        if old and old != new_delivery_id
+    ])
+
+
+def prune_unassignments(days=None):
+    """Delete unassignment notes older than ``days``; returns how many went."""
+    if days is None:
+        days = getattr(settings, "DELIVERY_SYNC_RETENTION_DAYS", 30)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OrderUnassignment.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _short_names(medicine_ids, quantities):
+    # run after the rollback, when stock is back to what other orders left
+    wanted = {mid: quantities[mid] for mid in medicine_ids}
+    names = list(
+        Medicine.objects.filter(pk__in=wanted.keys(), stock__lt=_qty_case(wanted))
+        .order_by("name")
+        .values_list("name", flat=True)
+    )
+    return names or list(
+        Medicine.objects.filter(pk__in=wanted.keys()).order_by("name").values_list("name", flat=True)
+    )
+
+
+def find_replayed_order(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def place_order(user, lines, *, full_name, phone, address, payment_method, idempotency_key=None):
+    """
+    Create an order for ``lines`` (``core.pricing.CartLine``) in one
+    transaction. Raises ``OutOfStock`` and writes nothing if any line can't
+    be fulfilled. If ``idempotency_key`` was already used by ``user``, the
+    existing order is returned instead of creating another one.
+    """
+    quantities = {}
+    for line in lines:
+        quantities[line.medicine.id] = quantities.get(line.medicine.id, 0) + line.qty
+
+    try:
+        with transaction.atomic():
+            order = _create_order(
+                user, lines, quantities, full_name, phone, address, payment_method, idempotency_key
+            )
+    except OutOfStock as exc:
+        raise OutOfStock(exc.medicine_ids, _short_names(exc.medicine_ids, quantities)) from None
+    except IntegrityError:
+        # a concurrent replay won the unique (user, idempotency_key) index
+        existing = find_replayed_order(user, idempotency_key)
+        if existing is None:
+            raise
+        return existing
+
+    # queryset updates skip the Medicine signals, so invalidate by hand
+    transaction.on_commit(bump_catalog_version)
+    return order
+
+
+def _create_order(user, lines, quantities, full_name, phone, address, payment_method, idempotency_key):
+    order = Order.objects.create(
+        total_amount=sum((line.subtotal for line in lines), ZERO),
+        item_count=sum(quantities.values()),
+        user=user,
+        full_name=full_name,
+        phone=phone,
+        address=address,
+        status="placed",
+        payment_method=payment_method,
+        is_paid=False,  # COD is unpaid until delivered
+        idempotency_key=idempotency_key,
+    )
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, medicine=line.medicine, qty=line.qty, price=line.unit_price)
+            for line in lines
+        ]
+    )
+    decrement_stock(quantities)
+    stats.record_created([order])
+    events.publish_orders([order], "created")
+    return order
+
+
+def refresh_totals(order_ids):
+    """
+    Recompute ``total_amount``/``item_count`` for ``order_ids`` from their
+    items with one grouped aggregate and one ``bulk_update``, moving the
+    difference into the stats rollup. Returns ``{order_id: (total, count)}``.
+    """
+    with transaction.atomic():
+        current = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .only("pk", "status", "payment_method", "created_at", "total_amount")
+        )
+        totals = order_totals(order_ids)
+        stats.record_total_changes(current, {oid: total for oid, (total, _) in totals.items()})
+
+        now = timezone.now()
+        orders = []
+        for order in current:
+            total, count = totals.get(order.pk, (ZERO, 0))
+            orders.append(Order(id=order.pk, total_amount=total, item_count=count, updated_at=now))
+        Order.objects.bulk_update(orders, ["total_amount", "item_count", "updated_at"])
+    return totals
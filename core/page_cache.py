@@ -0,0 +1,93 @@
+"""
+Response cache for anonymous catalog pages.
+
+Every cached page is keyed on the current catalog version, so bumping the
+version (done from the ``Medicine`` post_save/post_delete signals and after
+bulk stock updates) invalidates all of them at once without tracking keys.
+Use a shared cache backend when running more than one process, otherwise
+each process keeps its own version counter.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .utils import has_pending_messages
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def _new_version():
+    # start from the clock so an evicted counter never reuses an old version
+    return time.time_ns() // 1_000_000
+
+
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, _new_version, None)
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = _new_version()
+        cache.set(CATALOG_VERSION_KEY, version, None)
+        return version
+
+
+def _normalized_query(request, params):
+    items = []
+    for name in sorted(params):
+        value = " ".join((request.GET.get(name) or "").split())
+        if value:
+            items.append(f"{name}={value}")
+    return "&".join(items)
+
+
+def page_cache_key(request, params):
+    raw = f"{request.path}?{_normalized_query(request, params)}"
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:page:{get_catalog_version()}:{digest}"
+
+
+def catalog_page_cache(params=()):
+    """
+    Cache anonymous GET responses of a catalog view.
+
+    Only the query parameters named in ``params`` are part of the key, so
+    tracking parameters don't fragment the cache. Logged-in users, and
+    anyone with flash messages waiting, always get a fresh render because
+    the page contains per-user fragments.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+                or has_pending_messages(request)
+            ):
+                return view_func(request, *args, **kwargs)
+
+            key = page_cache_key(request, params)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Cache"] = "HIT"
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    getattr(settings, "CATALOG_CACHE_TIMEOUT", 300),
+                )
+                response["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
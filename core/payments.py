@@ -0,0 +1,276 @@
+"""
+Payment gateway adapter.
+
+Views talk to ``get_gateway()`` instead of building a ``razorpay.Client`` per
+request. The Razorpay implementation is created once per process and keeps a
+pooled keep-alive ``requests.Session`` with connect/read timeouts, behind a
+circuit breaker that fails fast for a while after repeated gateway failures.
+``PAYMENT_GATEWAY`` selects the implementation; ``FakeGateway`` answers
+locally for tests and load testing.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import razorpay
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+
+class GatewayError(Exception):
+    """The gateway rejected the request or returned an error."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway could not be reached, timed out, or the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds, then lets one trial call through (half-open):
+    success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self._state_locked()
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise GatewayUnavailable("Payment gateway is temporarily unavailable.")
+            if state == "half-open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across threads; ``rate=0`` disables it."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TimeoutSession(requests.Session):
+    """``requests.Session`` that applies a default ``(connect, read)`` timeout."""
+
+    def __init__(self, timeout, pool_size=10):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class RazorpayGateway:
+    def __init__(self):
+        self.key_id = settings.RAZORPAY_KEY_ID
+        self.session = TimeoutSession(
+            timeout=tuple(getattr(settings, "PAYMENT_GATEWAY_TIMEOUT", (3.05, 10))),
+            pool_size=getattr(settings, "PAYMENT_GATEWAY_POOL_SIZE", 10),
+        )
+        self.client = razorpay.Client(
+            session=self.session, auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+        )
+        self.breaker = CircuitBreaker(
+            threshold=getattr(settings, "PAYMENT_BREAKER_THRESHOLD", 5),
+            reset_timeout=getattr(settings, "PAYMENT_BREAKER_RESET", 30),
+        )
+
+    def _call(self, fn, *args):
+        self.breaker.before_call()
+        try:
+            result = fn(*args)
+        except razorpay.errors.BadRequestError as exc:
+            # our request was wrong; the gateway itself is healthy
+            self.breaker.record_success()
+            raise GatewayError(str(exc)) from exc
+        except (requests.RequestException, razorpay.errors.ServerError, razorpay.errors.GatewayError) as exc:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(str(exc) or exc.__class__.__name__) from exc
+        except BaseException:
+            # anything else (bad JSON, an SDK bug) must still end a half-open trial
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def create_order(self, amount_paise, receipt, notes=None):
+        return self._call(
+            self.client.order.create,
+            {
+                "amount": amount_paise,
+                "currency": "INR",
+                "payment_capture": 1,  # auto-capture (recommended)
+                "receipt": receipt,
+                "notes": notes or {},
+            },
+        )
+
+    def fetch_order(self, razorpay_order_id):
+        """
+        Return ``{"id", "status", "amount_paid", "payment_id"}`` for a gateway
+        order; ``payment_id`` is only looked up once the order is paid.
+        """
+        order = self._call(self.client.order.fetch, razorpay_order_id)
+        payment_id = None
+        if order.get("status") == "paid":
+            payments = self._call(self.client.order.payments, razorpay_order_id)
+            captured = [p for p in payments.get("items", []) if p.get("status") == "captured"]
+            payment_id = captured[0]["id"] if captured else None
+        return {
+            "id": order["id"],
+            "status": order.get("status"),
+            "amount_paid": order.get("amount_paid", 0),
+            "payment_id": payment_id,
+        }
+
+
+class FakeGateway:
+    """
+    Local stand-in for Razorpay; set ``PAYMENT_FAKE_LATENCY`` to simulate a
+    slow gateway. Orders live in memory unless ``PAYMENT_FAKE_STATE_FILE``
+    names a JSON file, which lets the web server and management commands
+    such as ``reconcile_payments`` see the same orders. Concurrent writers
+    in different processes can still lose each other's updates.
+    """
+
+    def __init__(self):
+        self.key_id = "rzp_test_fake"
+        self.latency = getattr(settings, "PAYMENT_FAKE_LATENCY", 0)
+        self.state_file = getattr(settings, "PAYMENT_FAKE_STATE_FILE", None)
+        self.orders = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # caller holds the lock
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file) as f:
+                self.orders = json.load(f)
+        except FileNotFoundError:
+            self.orders = {}
+
+    def _save(self):
+        if not self.state_file:
+            return
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.orders, f)
+        os.replace(tmp, self.state_file)
+
+    def create_order(self, amount_paise, receipt, notes=None):
+        if self.latency:
+            time.sleep(self.latency)
+        order = {
+            "id": f"order_fake{uuid.uuid4().hex[:14]}",
+            "amount": amount_paise,
+            "currency": "INR",
+            "receipt": receipt,
+            "notes": notes or {},
+            "status": "created",
+        }
+        with self._lock:
+            self._load()
+            self.orders[order["id"]] = order
+            self._save()
+        return order
+
+    def mark_paid(self, razorpay_order_id, amount_paise):
+        with self._lock:
+            self._load()
+            self.orders[razorpay_order_id] = {
+                "id": razorpay_order_id,
+                "amount": amount_paise,
+                "status": "paid",
+                "payment_id": f"pay_fake{uuid.uuid4().hex[:14]}",
+            }
+            self._save()
+
+    def fetch_order(self, razorpay_order_id):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._load()
+            order = self.orders.get(razorpay_order_id)
+        if order is None:
+            raise GatewayError(f"Unknown order {razorpay_order_id}")
+        paid = order["status"] == "paid"
+        return {
+            "id": razorpay_order_id,
+            "status": order["status"],
+            "amount_paid": order["amount"] if paid else 0,
+            "payment_id": order.get("payment_id"),
+        }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway named by ``PAYMENT_GATEWAY``."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                path = getattr(settings, "PAYMENT_GATEWAY", "core.payments.RazorpayGateway")
+                _gateway = import_string(path)()
+    return _gateway
+
+
+def reset_gateway():
+    """Forget the cached gateway, e.g. after changing ``PAYMENT_GATEWAY`` in tests."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
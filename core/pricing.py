@@ -0,0 +1,96 @@
+"""
+Cart and order totals.
+
+All money is ``Decimal`` (prices are ``DecimalField``) and converted to
+integer paise only at the payment gateway boundary, so totals never pick up
+float rounding errors. Persisted orders are totalled by the database in a
+single aggregate instead of iterating their items in Python.
+"""
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+from .models import Medicine, OrderItem
+
+ZERO = Decimal("0.00")
+PAISA = Decimal("0.01")
+
+LINE_TOTAL = ExpressionWrapper(
+    F("qty") * F("price"), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def to_paise(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+@dataclass
+class CartLine:
+    medicine: Medicine
+    qty: int
+
+    @property
+    def unit_price(self):
+        return self.medicine.price
+
+    @property
+    def subtotal(self):
+        return self.medicine.price * self.qty
+
+
+@dataclass
+class Totals:
+    lines: list = field(default_factory=list)
+    grand_total: Decimal = ZERO
+    item_count: int = 0
+
+    @property
+    def total_paise(self):
+        return to_paise(self.grand_total)
+
+
+def price_cart(cart, meds_map):
+    """
+    Price a session cart (``{"<id>": {"qty": n}}``) against ``meds_map``
+    (id -> Medicine), keeping cart order and skipping unknown ids.
+    """
+    totals = Totals()
+    for key, line in cart.items():
+        m = meds_map.get(int(key))
+        if not m:
+            continue
+        cart_line = CartLine(medicine=m, qty=line["qty"])
+        totals.lines.append(cart_line)
+        totals.grand_total += cart_line.subtotal
+        totals.item_count += cart_line.qty
+    return totals
+
+
+def cart_totals(cart, queryset=None):
+    """Fetch the cart's medicines in one query and price them."""
+    if not cart:
+        return Totals()
+    queryset = Medicine.objects.all() if queryset is None else queryset
+    meds = queryset.filter(id__in=[int(k) for k in cart.keys()])
+    return price_cart(cart, {m.id: m for m in meds})
+
+
+def order_totals(order_ids):
+    """
+    Return ``{order_id: (grand_total, item_count)}`` for ``order_ids`` using one
+    grouped aggregate over ``OrderItem``. Orders without items are omitted.
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values("order_id")
+        .annotate(total=Sum(LINE_TOTAL), count=Sum("qty"))
+        .order_by()
+    )
+    # SQLite hands back bare integers for whole-rupee sums; keep two places
+    return {r["order_id"]: (Decimal(r["total"]).quantize(PAISA), r["count"]) for r in rows}
+
+
+def order_lines(order):
+    """Items of ``order`` with their medicine loaded and ``line_total`` computed by the database."""
+    return order.items.select_related("medicine").annotate(line_total=LINE_TOTAL).order_by("id")
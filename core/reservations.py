@@ -0,0 +1,88 @@
+"""
+Time-limited stock holds for session carts.
+
+Every cart mutation rewrites the cart's holds (one row per medicine) with a
+fresh expiry, so the stock shown to other shoppers is ``stock`` minus the
+quantities held by live carts. Expired holds are simply ignored by the
+availability query and removed later by ``manage.py sweep_reservations``.
+Catalog pages show that figure, so changing holds bumps the catalog version.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import StockReservation
+from .page_cache import bump_catalog_version
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, "CART_RESERVATION_MINUTES", 15))
+
+
+def cart_token(session):
+    # kept in the session data so it survives the key rotation on login
+    token = session.get("cart_token")
+    if not token:
+        token = uuid.uuid4().hex
+        session["cart_token"] = token
+    return token
+
+
+def with_available(queryset, token=None):
+    """
+    Annotate medicines with ``available``: stock minus quantities held by
+    other live carts (the cart owning ``token`` is not counted against itself).
+    """
+    live = Q(reservations__expires_at__gt=timezone.now())
+    if token:
+        live &= ~Q(reservations__cart_token=token)
+    held = Coalesce(Sum("reservations__qty", filter=live), Value(0))
+    return queryset.annotate(available=Greatest(F("stock") - held, Value(0)))
+
+
+def sync(token, cart):
+    """Make the holds of ``token`` match ``cart`` and push their expiry forward."""
+    ids = [int(k) for k in cart.keys()]
+    removed = StockReservation.objects.filter(cart_token=token).exclude(medicine_id__in=ids).delete()[0]
+    if removed or ids:
+        transaction.on_commit(bump_catalog_version)
+    if not ids:
+        return
+
+    expires_at = timezone.now() + hold_duration()
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(cart_token=token, medicine_id=mid, qty=cart[str(mid)]["qty"], expires_at=expires_at)
+            for mid in ids
+        ],
+        update_conflicts=True,
+        unique_fields=["cart_token", "medicine"],
+        update_fields=["qty", "expires_at"],
+    )
+
+
+def release(*tokens):
+    if StockReservation.objects.filter(cart_token__in=tokens).delete()[0]:
+        transaction.on_commit(bump_catalog_version)
+
+
+def sweep_expired(batch_size=1000, now=None):
+    """Delete expired holds in primary-key batches; returns the number removed."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            if removed:
+                bump_catalog_version()
+            return removed
+        removed += StockReservation.objects.filter(id__in=ids).delete()[0]
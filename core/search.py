@@ -0,0 +1,145 @@
+"""
+Full-text search over the medicine catalog.
+
+SQLite keeps an FTS5 table (``core_medicine_fts``) with one row per active
+medicine, kept in sync from the ``Medicine`` save/delete signals. PostgreSQL
+searches a GIN expression index over ``to_tsvector`` instead, which the
+database maintains itself. Any other backend falls back to ``icontains``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+FTS_TABLE = "core_medicine_fts"
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || "
+    "coalesce(brand, '') || ' ' || coalesce(description, ''))"
+)
+# bm25 column weights: name, brand, description
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+MAX_TERMS = 8
+
+_fts_ready = None
+
+
+def _max_results():
+    return getattr(settings, "SEARCH_MAX_RESULTS", 500)
+
+
+def _terms(q):
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def _sqlite_fts_ready():
+    global _fts_ready
+    if connection.vendor != "sqlite":
+        return False
+    if _fts_ready is None:
+        _fts_ready = FTS_TABLE in connection.introspection.table_names()
+    return _fts_ready
+
+
+def index_medicine(medicine):
+    if not _sqlite_fts_ready():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [medicine.pk])
+        if medicine.is_active:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, brand, description) VALUES (%s, %s, %s, %s)",
+                [medicine.pk, medicine.name, medicine.brand, medicine.description],
+            )
+
+
+def unindex_medicine(pk):
+    if not _sqlite_fts_ready():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild_index():
+    """
+    Repopulate the FTS table from scratch and return the number of rows
+    indexed, or ``None`` when the backend keeps its own index.
+    """
+    if not _sqlite_fts_ready():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, brand, description) "
+            "SELECT id, name, brand, description FROM core_medicine WHERE is_active"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def ranked_ids(q, limit=None, in_stock=False):
+    """
+    Return ids of active medicines (in stock, if asked) matching every term
+    of ``q`` (as a prefix), best match first, or ``None`` when the database
+    has no full-text index to ask.
+    """
+    terms = _terms(q)
+    if not terms:
+        return None
+    limit = limit or _max_results()
+    # filter before the LIMIT so in-stock matches ranked past it aren't lost
+    stock_filter = " AND m.stock > 0" if in_stock else ""
+
+    if _sqlite_fts_ready():
+        match = " ".join(f'"{t}"*' for t in terms)
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        sql = (
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} "
+            f"JOIN core_medicine m ON m.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND m.is_active{stock_filter} "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s"
+        )
+        params = [match, limit]
+    elif connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{t}:*" for t in terms)
+        sql = (
+            f"SELECT id FROM core_medicine m "
+            f"WHERE is_active{stock_filter} AND {PG_DOCUMENT} @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s)) DESC, name LIMIT %s"
+        )
+        params = [tsquery, tsquery, limit]
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_medicines(queryset, q, in_stock=False):
+    """
+    Narrow ``queryset`` to medicines matching ``q`` and annotate each row with
+    ``search_rank`` (0 is the best match). Returns ``(queryset, truncated)``;
+    ``truncated`` is True when more than ``SEARCH_MAX_RESULTS`` matched and
+    only the best of them are kept.
+    """
+    limit = _max_results()
+    ids = ranked_ids(q, limit + 1, in_stock=in_stock)
+
+    if ids is None:
+        queryset = queryset.filter(Q(name__icontains=q) | Q(brand__icontains=q) | Q(description__icontains=q))
+        if in_stock:
+            queryset = queryset.filter(stock__gt=0)
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField())), False
+
+    if not ids:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField())), False
+
+    truncated = len(ids) > limit
+    ids = ids[:limit]
+    rank = Case(
+        *[When(pk=pk, then=Value(pos)) for pos, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank), truncated
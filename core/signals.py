@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, images, search, stats
+from .models import Medicine, Order
+from .page_cache import bump_catalog_version
+
+SEARCH_FIELDS = {"name", "brand", "description", "is_active"}
+
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, update_fields=None, **kwargs):
+    # stock-only saves (checkout, cancellations) don't touch the search index
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        search.index_medicine(instance)
+        transaction.on_commit(lambda: autocomplete.medicine_changed(instance))
+    if not images.variants_current(instance) and instance.image_variants:
+        # generate_image_variants builds the new ones; until then pages use the upload
+        stale = images.clear_variants(instance)
+        transaction.on_commit(lambda: images.delete_variants(stale))
+    # pages show stock too, so any save invalidates the cached catalog
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Medicine)
+def medicine_deleted(sender, instance, **kwargs):
+    search.unindex_medicine(instance.pk)
+    stale = images.variant_paths(instance.image_variants)
+    transaction.on_commit(lambda: images.delete_variants(stale))
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.medicine_removed(pk))
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # keep the daily rollup in step with admin and cascade deletes
+    stats.record_deleted([instance])
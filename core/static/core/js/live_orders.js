@@ -0,0 +1,116 @@
+// Patches order tables in place from the /events/orders/ server-sent events.
+// Rows carry data-order-id; cells to update carry data-cell="status" or "delivery".
+// Without the stream (the default, or when it answers 204) the page polls
+// /events/orders/changes/ and only shows the reload notice.
+(function () {
+  var STATUS_BADGES = {
+    placed: ["badge-info", "Placed"],
+    packed: ["badge-warning", "Packed"],
+    shipped: ["badge-info", "Shipped"],
+    delivered: ["badge-success", "Delivered"],
+    cancelled: ["badge-danger", "Cancelled"]
+  };
+
+  function badge(cls, text) {
+    var span = document.createElement("span");
+    span.className = "badge " + (cls || "");
+    var dot = document.createElement("span");
+    dot.className = "dot";
+    span.appendChild(dot);
+    span.appendChild(document.createTextNode(text));
+    return span;
+  }
+
+  function setCell(row, name, node) {
+    var cell = row.querySelector('[data-cell="' + name + '"]');
+    if (!cell) return;
+    cell.replaceChildren(node);
+    row.style.transition = "background-color .6s";
+    row.style.backgroundColor = "rgba(59,130,246,.08)";
+    setTimeout(function () { row.style.backgroundColor = ""; }, 1200);
+  }
+
+  function bump(name, delta) {
+    var el = document.querySelector('[data-kpi="' + name + '"]');
+    if (el) el.textContent = String(parseInt(el.textContent, 10) + delta);
+  }
+
+  // options: url, stream, pollUrl, pollSeconds, userId (delivery pages),
+  // deliveryNames ({id: username}), notice (element)
+  window.liveOrders = function (options) {
+    var names = options.deliveryNames || {};
+    var pending = 0;
+
+    function notify(text) {
+      if (!options.notice) return;
+      options.notice.hidden = false;
+      options.notice.querySelector("[data-notice-text]").textContent = text;
+    }
+
+    function onOrder(ev) {
+      var row = document.querySelector('tr[data-order-id="' + ev.id + '"]');
+
+      if (ev.kind === "created") {
+        bump("total", 1);
+        bump("pending", 1);
+      }
+
+      if (options.userId && ev.delivery_id !== options.userId) {
+        if (row) row.remove();  // reassigned to someone else
+        return;
+      }
+
+      if (!row) {
+        if (ev.kind === "created" || ev.kind === "assigned") {
+          pending += 1;
+          notify(pending + (pending === 1 ? " new order" : " new orders") + " since this page loaded.");
+        }
+        return;
+      }
+
+      if (ev.kind === "status") {
+        var b = STATUS_BADGES[ev.status] || ["", ev.status];
+        var old = row.getAttribute("data-status");
+        if (old !== "delivered" && ev.status === "delivered") { bump("delivered", 1); bump("pending", -1); }
+        row.setAttribute("data-status", ev.status);
+        setCell(row, "status", badge(b[0], b[1]));
+      } else if (ev.kind === "assigned") {
+        setCell(row, "delivery", ev.delivery_id
+          ? badge("badge-success", names[ev.delivery_id] || "#" + ev.delivery_id)
+          : badge("badge-warning", "Not Assigned"));
+      }
+    }
+
+    function poll() {
+      var since = null;
+      var changed = 0;
+      function tick() {
+        var url = options.pollUrl + (since ? "?since=" + encodeURIComponent(since) : "");
+        fetch(url, { credentials: "same-origin" })
+          .then(function (r) { return r.ok ? r.json() : null; })
+          .then(function (data) {
+            if (!data) return;
+            since = data.since;
+            changed += data.changed;
+            if (changed) notify(changed + (changed === 1 ? " order update" : " order updates") + " since this page loaded.");
+          })
+          .catch(function () {})
+          .then(function () { setTimeout(tick, (options.pollSeconds || 30) * 1000); });
+      }
+      tick();
+    }
+
+    if (!options.stream || !window.EventSource) {
+      if (options.pollUrl && window.fetch) poll();
+      return;
+    }
+
+    var source = new EventSource(options.url);
+    source.addEventListener("order", function (e) { onOrder(JSON.parse(e.data)); });
+    source.addEventListener("resync", function () { window.location.reload(); });
+    source.addEventListener("error", function () {
+      // a 204 (WSGI server) closes the stream for good
+      if (source.readyState === EventSource.CLOSED && options.pollUrl && window.fetch) poll();
+    });
+  };
+})();
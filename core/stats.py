@@ -0,0 +1,161 @@
+"""
+Daily order rollups.
+
+``OrderDailyStat`` keeps one row per (creation day, status, payment method)
+with the number of orders and their total. Code that creates orders or
+changes their status calls ``record_created`` / ``record_transition`` inside
+the same transaction, so dashboard numbers are sums over a few rows per day
+instead of scans over ``Order``. ``manage.py rebuild_order_stats`` recomputes
+the table from scratch.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderDailyStat
+from .pricing import ZERO
+
+
+def _bucket(order):
+    return (timezone.localdate(order.created_at), order.payment_method)
+
+
+def apply_deltas(deltas):
+    """Add ``{(day, status, payment_method): (count, amount)}`` to the rollup rows."""
+    for (day, status, payment_method), (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        key = {"day": day, "status": status, "payment_method": payment_method}
+        changes = {"order_count": F("order_count") + count, "amount": F("amount") + amount}
+        if OrderDailyStat.objects.filter(**key).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                OrderDailyStat.objects.create(**key, order_count=count, amount=amount)
+        except IntegrityError:
+            # another transaction created the row first
+            OrderDailyStat.objects.filter(**key).update(**changes)
+
+
+def record_created(orders):
+    deltas = defaultdict(lambda: (0, ZERO))
+    for order in orders:
+        day, method = _bucket(order)
+        count, amount = deltas[(day, order.status, method)]
+        deltas[(day, order.status, method)] = (count + 1, amount + order.total_amount)
+    apply_deltas(deltas)
+
+
+def record_deleted(orders):
+    deltas = defaultdict(lambda: (0, ZERO))
+    for order in orders:
+        day, method = _bucket(order)
+        count, amount = deltas[(day, order.status, method)]
+        deltas[(day, order.status, method)] = (count - 1, amount - order.total_amount)
+    apply_deltas(deltas)
+
+
+def record_transition(orders, new_status):
+    """
+    Move ``orders`` from the status they have in memory to ``new_status``.
+    Call before updating the objects (or pass copies holding the old status).
+    """
+    deltas = defaultdict(lambda: (0, ZERO))
+    for order in orders:
+        if order.status == new_status:
+            continue
+        day, method = _bucket(order)
+        count, amount = deltas[(day, order.status, method)]
+        deltas[(day, order.status, method)] = (count - 1, amount - order.total_amount)
+        count, amount = deltas[(day, new_status, method)]
+        deltas[(day, new_status, method)] = (count + 1, amount + order.total_amount)
+    apply_deltas(deltas)
+
+
+def record_total_changes(orders, new_totals):
+    """
+    Re-count ``orders`` (holding their old totals) at ``{order_id: total}``,
+    for totals filled in after the order was counted.
+    """
+    deltas = defaultdict(lambda: (0, ZERO))
+    for order in orders:
+        change = new_totals.get(order.pk, ZERO) - order.total_amount
+        if not change:
+            continue
+        day, method = _bucket(order)
+        count, amount = deltas[(day, order.status, method)]
+        deltas[(day, order.status, method)] = (count, amount + change)
+    apply_deltas(deltas)
+
+
+def rebuild():
+    """Recompute every rollup row from ``Order``; returns the number of rows written."""
+    rows = (
+        Order.objects.annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+        .values("day", "status", "payment_method")
+        .annotate(order_count=Count("id"), amount=Sum("total_amount"))
+        .order_by()
+    )
+    stats = [OrderDailyStat(**row) for row in rows]
+    with transaction.atomic():
+        OrderDailyStat.objects.all().delete()
+        OrderDailyStat.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+def summary(stats=None):
+    """Totals for the dashboard cards from ``stats`` (an ``OrderDailyStat`` queryset)."""
+    stats = OrderDailyStat.objects.all() if stats is None else stats
+    return stats.aggregate(
+        total=Sum("order_count", default=0),
+        delivered=Sum("order_count", filter=Q(status="delivered"), default=0),
+        pending=Sum("order_count", filter=~Q(status="delivered"), default=0),
+        revenue=Sum("amount", filter=~Q(status="cancelled"), default=ZERO),
+    )
+
+
+def status_totals(stats=None):
+    """``[(status label, count, amount)]`` over all days, in ``Order.STATUS_CHOICES`` order."""
+    stats = OrderDailyStat.objects.all() if stats is None else stats
+    rows = {
+        row["status"]: row
+        for row in stats.values("status").annotate(count=Sum("order_count"), total=Sum("amount")).order_by()
+    }
+    return [
+        (label, rows.get(value, {}).get("count", 0), rows.get(value, {}).get("total", ZERO))
+        for value, label in Order.STATUS_CHOICES
+    ]
+
+
+def daily_trend(days=14, stats=None):
+    """``[{"day", "orders", "revenue", "cancelled"}]`` for the last ``days`` days, oldest first."""
+    stats = OrderDailyStat.objects.all() if stats is None else stats
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = {
+        row["day"]: row
+        for row in stats.filter(day__gte=since)
+        .values("day")
+        .annotate(
+            orders=Sum("order_count"),
+            revenue=Sum("amount", filter=~Q(status="cancelled"), default=ZERO),
+            cancelled=Sum("order_count", filter=Q(status="cancelled"), default=0),
+        )
+        .order_by()
+    }
+    trend = []
+    for i in range(days):
+        day = since + timedelta(days=i)
+        row = rows.get(day, {})
+        trend.append(
+            {
+                "day": day,
+                "orders": row.get("orders", 0),
+                "revenue": row.get("revenue", ZERO),
+                "cancelled": row.get("cancelled", 0),
+            }
+        )
+    return trend
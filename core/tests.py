@@ -1,3 +1,696 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import images, intake, reservations, stats, webhooks
+from .page_cache import bump_catalog_version
+from .models import Medicine, Order, OrderDailyStat, OrderIntent, OrderItem, PaymentEvent, StockReservation
+from .orders import OutOfStock, cancel_orders, place_order
+from .pagination import encode_cursor, keyset_page
+from .payments import CircuitBreaker, FakeGateway, GatewayUnavailable, RazorpayGateway, get_gateway, reset_gateway
+from .pricing import CartLine
+from .search import search_medicines
+
+
+def intent_payload(medicine, qty=1, **overrides):
+    payload = {
+        "lines": [[medicine.id, qty]],
+        "full_name": "Test User",
+        "phone": "9999999999",
+        "address": "1 Test Street",
+        "payment_method": "cod",
+    }
+    payload.update(overrides)
+    return payload
+
+
+
+def order_details(**overrides):
+    details = {"full_name": "Test User", "phone": "9999999999", "address": "1 Test Street", "payment_method": "cod"}
+    details.update(overrides)
+    return details
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("customer", password="x")
+        self.paracetamol = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=5)
+        self.cetirizine = Medicine.objects.create(name="Cetirizine", price=Decimal("2.50"), stock=1)
+
+    def test_order_items_totals_and_stock(self):
+        order = place_order(
+            self.user, [CartLine(self.paracetamol, 2), CartLine(self.cetirizine, 1)], **order_details()
+        )
+
+        self.assertEqual(order.total_amount, Decimal("22.50"))
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(order.items.count(), 2)
+        self.paracetamol.refresh_from_db()
+        self.cetirizine.refresh_from_db()
+        self.assertEqual((self.paracetamol.stock, self.cetirizine.stock), (3, 0))
+
+    def test_out_of_stock_line_rolls_back_the_whole_order(self):
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(self.user, [CartLine(self.paracetamol, 2), CartLine(self.cetirizine, 2)], **order_details())
+
+        self.assertEqual(ctx.exception.names, ["Cetirizine"])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.stock, 5)
+        self.assertFalse(OrderDailyStat.objects.filter(order_count__gt=0).exists())
+
+    def test_replayed_idempotency_key_returns_the_first_order(self):
+        first = place_order(self.user, [CartLine(self.paracetamol, 2)], idempotency_key="key-12345", **order_details())
+        again = place_order(self.user, [CartLine(self.paracetamol, 2)], idempotency_key="key-12345", **order_details())
+
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.stock, 3)
+
+    def test_checkout_double_submit_places_one_order(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("core:cart_add", args=[self.paracetamol.id]))
+        form = {**order_details(), "idempotency_key": "submit-12345"}
+
+        first = self.client.post(reverse("core:checkout"), form)
+        second = self.client.post(reverse("core:checkout"), form)
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(Order.objects.count(), 1)
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.stock, 4)
+
+
+class OrderDetailTests(TestCase):
+    def test_get_is_read_only_and_revalidates(self):
+        user = User.objects.create_user("customer", password="x")
+        medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=5)
+        order = place_order(user, [CartLine(medicine, 1)], **order_details())
+        self.client.force_login(user)
+        url = reverse("core:order_detail", args=[order.id])
+
+        self.client.get(url)  # sets the CSRF cookie, which is part of the ETag
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(Order.objects.get(pk=order.pk).updated_at, order.updated_at)
+
+
+class CancelOrdersTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("customer", password="x")
+        self.paracetamol = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+        self.cetirizine = Medicine.objects.create(name="Cetirizine", price=Decimal("2.50"), stock=10)
+        lines = [CartLine(self.paracetamol, 2), CartLine(self.cetirizine, 3)]
+        self.orders = [place_order(user, lines, **order_details()) for _ in range(2)]
+
+    def stock(self):
+        return list(Medicine.objects.order_by("id").values_list("stock", flat=True))
+
+    def test_cancel_restocks_every_item_once(self):
+        self.assertEqual(self.stock(), [6, 4])
+
+        cancelled = cancel_orders([o.pk for o in self.orders])
+        self.assertEqual(sorted(cancelled), sorted(o.pk for o in self.orders))
+        self.assertEqual(self.stock(), [10, 10])
+
+        self.assertEqual(cancel_orders([o.pk for o in self.orders]), [])
+        self.assertEqual(self.stock(), [10, 10])
+        counts = dict(OrderDailyStat.objects.values_list("status", "order_count"))
+        self.assertEqual(counts, {"placed": 0, "cancelled": 2})
+
+    def test_cancel_fills_in_missing_totals_of_legacy_orders(self):
+        legacy = self.orders[0]
+        Order.objects.filter(pk=legacy.pk).update(total_amount=0, item_count=0)
+        stats.rebuild()
+
+        cancel_orders([legacy.pk])
+
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.total_amount, legacy.item_count), (Decimal("27.50"), 5))
+        amounts = dict(OrderDailyStat.objects.values_list("status", "amount"))
+        self.assertEqual(amounts, {"placed": Decimal("27.50"), "cancelled": Decimal("27.50")})
+
+    def test_shipped_orders_are_not_cancelled(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(status="shipped")
+
+        self.assertEqual(cancel_orders([o.pk for o in self.orders]), [self.orders[1].pk])
+        self.assertEqual(self.stock(), [8, 7])
+
+
+class OrderStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("customer", password="x")
+        medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+        self.order = place_order(self.user, [CartLine(medicine, 2)], **order_details())
+
+    def rollup(self):
+        return list(
+            OrderDailyStat.objects.filter(order_count__gt=0).values_list("status", "payment_method", "order_count")
+        )
+
+    def test_deleting_an_order_leaves_the_rollup_matching_a_rebuild(self):
+        self.order.delete()
+
+        self.assertEqual(self.rollup(), [])
+        stats.rebuild()
+        self.assertEqual(self.rollup(), [])
+
+    def test_cod_order_cannot_be_switched_to_online_payment(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("core:start_payment", args=[self.order.id]))
+
+        self.assertRedirects(response, reverse("core:order_detail", args=[self.order.id]), fetch_redirect_response=False)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_method, "cod")
+        self.assertEqual(self.rollup(), [("placed", "cod", 1)])
+
+
+@override_settings(ORDER_INTAKE_MAX_ATTEMPTS=3)
+class OrderIntakeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("customer", password="x")
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+
+    def queue(self, key, payload):
+        return OrderIntent.objects.create(user=self.user, idempotency_key=key, payload=payload)
+
+    def test_bad_intent_does_not_fail_the_rest_of_its_batch(self):
+        bad_payload = intent_payload(self.medicine)
+        del bad_payload["phone"]
+        bad = self.queue("bad", bad_payload)
+        good = self.queue("good", intent_payload(self.medicine, qty=2))
+
+        with self.assertLogs("core.intake", level="ERROR"):
+            intake.process_batch(intake.claim_batch(10))
+
+        good.refresh_from_db()
+        self.assertEqual(good.status, "done")
+        self.assertEqual(good.attempts, 0)
+        self.assertIsNotNone(good.order)
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, "pending")
+        self.assertEqual(bad.attempts, 1)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock, 8)
+
+    def test_intent_fails_after_its_own_attempts_run_out(self):
+        bad_payload = intent_payload(self.medicine)
+        del bad_payload["phone"]
+        bad = self.queue("bad", bad_payload)
+
+        with self.assertLogs("core.intake", level="ERROR"):
+            for _ in range(3):
+                intake.process_batch(intake.claim_batch(10))
+
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, "failed")
+        self.assertEqual(bad.attempts, 3)
+        self.assertEqual(intake.claim_batch(10), [])
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        for name in ("Aspirin", "Cetirizine", "Ibuprofen"):
+            Medicine.objects.create(name=name, price=Decimal("5.00"), stock=5)
+
+    def test_pages_follow_the_cursor(self):
+        first, cursor = keyset_page(Medicine.objects.all(), ("name", "id"), size=2)
+        rest, end = keyset_page(Medicine.objects.all(), ("name", "id"), cursor, size=2)
+        self.assertEqual([m.name for m in first + rest], ["Aspirin", "Cetirizine", "Ibuprofen"])
+        self.assertIsNone(end)
+
+    def test_tampered_cursor_is_treated_as_no_cursor(self):
+        for values in (["a", "b"], [None, None], ["x", [1]], ["x", 10 ** 30]):
+            rows, _ = keyset_page(Medicine.objects.all(), ("name", "id"), encode_cursor(values), size=5)
+            self.assertEqual(len(rows), 3, values)
+
+    def test_catalog_pages_survive_tampered_cursors(self):
+        cursor = encode_cursor(["a", "b"])
+        self.assertEqual(self.client.get(reverse("core:home"), {"cursor": cursor}).status_code, 200)
+        self.assertEqual(self.client.get(reverse("core:catalog_api"), {"cursor": cursor}).status_code, 200)
+
+
+@override_settings(SEARCH_MAX_RESULTS=2)
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        # the best-ranked matches are out of stock
+        for name, stock in (("Zinc", 0), ("Zinc Plus", 0), ("Zinc Forte Tablets", 3), ("Zinc Syrup For Kids", 4)):
+            Medicine.objects.create(name=name, price=Decimal("5.00"), stock=stock)
+
+    def test_in_stock_filter_applies_before_the_result_limit(self):
+        medicines, truncated = search_medicines(Medicine.objects.all(), "zinc", in_stock=True)
+        self.assertEqual(
+            sorted(m.name for m in medicines), ["Zinc Forte Tablets", "Zinc Syrup For Kids"]
+        )
+        self.assertFalse(truncated)
+
+    def test_count_is_marked_capped_when_search_hits_its_limit(self):
+        response = self.client.get(reverse("core:catalog_api"), {"q": "zinc"})
+        data = response.json()
+        self.assertEqual(data["count"], 2)
+        self.assertTrue(data["count_capped"])
+
+
+@override_settings(RAZORPAY_KEY_ID="rzp_test_key", RAZORPAY_KEY_SECRET="secret")
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("core.payments.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_closed_open_half_open_closed(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+
+        self.now += 30
+        self.assertEqual(breaker.state, "half-open")
+        breaker.before_call()
+        # only one trial call at a time
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.now += 30
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+    def test_unexpected_error_during_trial_does_not_wedge_the_breaker(self):
+        gateway = RazorpayGateway()
+        gateway.breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        gateway.breaker.record_failure()
+        self.now += 30
+
+        def broken(*args):
+            raise ValueError("Expecting value: line 1 column 1")
+
+        with self.assertRaises(ValueError):
+            gateway._call(broken)
+        self.assertEqual(gateway.breaker.state, "open")
+
+        self.now += 30
+        self.assertEqual(gateway._call(lambda: {"id": "order_1"}), {"id": "order_1"})
+        self.assertEqual(gateway.breaker.state, "closed")
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET="whsec")
+class RazorpayWebhookTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("customer", password="x")
+        medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=5)
+        self.order = place_order(user, [CartLine(medicine, 2)], **order_details(payment_method="razorpay"))
+        self.order.razorpay_order_id = "order_rp1"
+        self.order.save()
+
+    def body(self, order_id="order_rp1", amount=2000):
+        payment = {"id": "pay_1", "order_id": order_id, "amount": amount}
+        return json.dumps({"event": "payment.captured", "payload": {"payment": {"entity": payment}}}).encode()
+
+    def post(self, body, signature=None, **headers):
+        if signature is None:
+            signature = hmac.new(b"whsec", body, hashlib.sha256).hexdigest()
+        if signature:
+            headers["HTTP_X_RAZORPAY_SIGNATURE"] = signature
+        return self.client.post(
+            reverse("core:razorpay_webhook"), body, content_type="application/json", **headers
+        )
+
+    def test_signature_is_checked(self):
+        body = self.body()
+        self.assertEqual(self.post(body).status_code, 200)
+        tampered = body.replace(b"2000", b"1")
+        self.assertEqual(self.post(tampered, hmac.new(b"whsec", body, hashlib.sha256).hexdigest()).status_code, 400)
+        self.assertEqual(self.post(body, signature="").status_code, 400)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_duplicate_delivery_is_stored_once(self):
+        body = self.body()
+        self.post(body, HTTP_X_RAZORPAY_EVENT_ID="evt_1")
+        self.post(body, HTTP_X_RAZORPAY_EVENT_ID="evt_1")
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+        self.assertEqual(webhooks.process_pending(), 1)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(self.order.razorpay_payment_id, "pay_1")
+
+    def test_oversized_event_id_falls_back_to_body_hash(self):
+        body = self.body()
+        self.assertEqual(self.post(body, HTTP_X_RAZORPAY_EVENT_ID="e" * 65).status_code, 200)
+        self.assertEqual(PaymentEvent.objects.get().event_id, hashlib.sha256(body).hexdigest())
+
+    def test_amount_mismatch_leaves_order_unpaid(self):
+        self.post(self.body(amount=100))
+        webhooks.process_pending()
+
+        event = PaymentEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertIn("does not match", event.error)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+
+    def test_legacy_order_without_totals_is_still_checked(self):
+        Order.objects.filter(pk=self.order.pk).update(total_amount=0, item_count=0)
+        self.post(self.body(amount=100))
+        webhooks.process_pending()
+
+        self.assertIn("does not match", PaymentEvent.objects.get().error)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+        self.assertEqual(self.order.total_amount, Decimal("20.00"))
+
+    @override_settings(PAYMENT_EVENT_MAX_ATTEMPTS=2)
+    def test_unknown_order_is_retried_before_giving_up(self):
+        self.post(self.body(order_id="order_later"))
+        self.assertEqual(webhooks.process_pending(), 1)
+        event = PaymentEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        # not due yet
+        self.assertEqual(webhooks.process_pending(), 0)
+
+        PaymentEvent.objects.update(retry_after=None)
+        webhooks.process_pending()
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, "No order for this Razorpay order id.")
+
+
+@override_settings(DELIVERY_SYNC_SETTLE_SECONDS=0)
+class OrderChangesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("boss", password="x")
+        self.admin.profile.role = "admin"
+        self.admin.profile.save()
+        self.rider = User.objects.create_user("rider", password="x")
+        self.rider.profile.role = "delivery"
+        self.rider.profile.save()
+        self.customer = User.objects.create_user("customer", password="x")
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+
+    def poll(self, user, since=None):
+        self.client.force_login(user)
+        params = {"since": since} if since else {}
+        return self.client.get(reverse("core:order_changes"), params).json()
+
+    def test_counts_changes_since_the_last_poll(self):
+        admin_since = self.poll(self.admin)["since"]
+        rider_since = self.poll(self.rider)["since"]
+        order = place_order(self.customer, [CartLine(self.medicine, 1)], **order_details())
+        place_order(self.customer, [CartLine(self.medicine, 1)], **order_details())
+        order.assigned_delivery = self.rider
+        order.save()
+
+        admin = self.poll(self.admin, admin_since)
+        self.assertEqual(admin["changed"], 2)
+        self.assertEqual(self.poll(self.admin, admin["since"])["changed"], 0)
+        self.assertEqual(self.poll(self.rider, rider_since)["changed"], 1)
+
+    def test_customers_cannot_poll(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse("core:order_changes")).status_code, 403)
+
+    def test_stream_is_off_by_default(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse("core:order_events")).status_code, 204)
+
+
+@override_settings(PAYMENT_GATEWAY="core.payments.FakeGateway")
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        reset_gateway()
+        self.addCleanup(reset_gateway)
+        self.gateway = get_gateway()
+        self.user = User.objects.create_user("customer", password="x")
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+
+    def razorpay_order(self):
+        order = place_order(self.user, [CartLine(self.medicine, 1)], **order_details(payment_method="razorpay"))
+        order.razorpay_order_id = self.gateway.create_order(1000, f"order_{order.id}")["id"]
+        order.save()
+        return order
+
+    def test_marks_only_orders_the_gateway_reports_paid(self):
+        paid, unpaid, short = (self.razorpay_order() for _ in range(3))
+        self.gateway.mark_paid(paid.razorpay_order_id, 1000)
+        self.gateway.mark_paid(short.razorpay_order_id, 500)
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command("reconcile_payments", chunk_size=2, workers=2, rate=1000, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(
+            set(Order.objects.filter(is_paid=True).values_list("id", flat=True)), {paid.id}
+        )
+        paid.refresh_from_db()
+        self.assertEqual(paid.razorpay_payment_id, self.gateway.orders[paid.razorpay_order_id]["payment_id"])
+        self.assertIn("Checked 3 orders", stdout.getvalue())
+        self.assertIn(f"Order #{short.id}", stderr.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        order = self.razorpay_order()
+        self.gateway.mark_paid(order.razorpay_order_id, 1000)
+        call_command("reconcile_payments", dry_run=True, rate=0, stdout=StringIO())
+        order.refresh_from_db()
+        self.assertFalse(order.is_paid)
+
+    def test_state_file_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(PAYMENT_FAKE_STATE_FILE=os.path.join(tmp, "gateway.json")):
+                created = FakeGateway().create_order(1000, "r1")
+                FakeGateway().mark_paid(created["id"], 1000)
+                self.assertEqual(FakeGateway().fetch_order(created["id"])["amount_paid"], 1000)
+
+
+def png_upload(name, size=(400, 300)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name, MEDICINE_IMAGE_WIDTHS=(144,))
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def generate(self):
+        call_command("generate_image_variants", workers=1, stdout=StringIO())
+
+    def test_saving_an_image_does_not_encode_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            med = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), image=png_upload("para.png"))
+        med.refresh_from_db()
+        self.assertEqual(med.image_variants, {})
+
+        self.generate()
+        med.refresh_from_db()
+        self.assertTrue(images.variants_current(med))
+        self.assertTrue(all(default_storage.exists(p) for p in images.variant_paths(med.image_variants)))
+
+    def test_new_image_and_delete_remove_old_variants(self):
+        med = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), image=png_upload("para.png"))
+        self.generate()
+        med.refresh_from_db()
+        first = images.variant_paths(med.image_variants)
+
+        med.image = png_upload("para-new.png")
+        with self.captureOnCommitCallbacks(execute=True):
+            med.save()
+        med.refresh_from_db()
+        self.assertEqual(med.image_variants, {})
+        self.assertFalse(any(default_storage.exists(p) for p in first))
+
+        self.generate()
+        med.refresh_from_db()
+        second = images.variant_paths(med.image_variants)
+        with self.captureOnCommitCallbacks(execute=True):
+            med.delete()
+        self.assertFalse(any(default_storage.exists(p) for p in second))
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=3)
+
+    def hold(self, token, qty, minutes=15):
+        StockReservation.objects.create(
+            cart_token=token, medicine=self.medicine, qty=qty,
+            expires_at=timezone.now() + timedelta(minutes=minutes),
+        )
+
+    def available(self, token=None):
+        return reservations.with_available(Medicine.objects.all(), token).get(pk=self.medicine.pk).available
+
+    def test_sync_upserts_and_drops_holds(self):
+        key = str(self.medicine.id)
+        reservations.sync("cart1", {key: {"qty": 1}})
+        first = StockReservation.objects.get()
+        reservations.sync("cart1", {key: {"qty": 2}})
+        second = StockReservation.objects.get()
+        self.assertEqual((second.pk, second.qty), (first.pk, 2))
+        self.assertGreaterEqual(second.expires_at, first.expires_at)
+
+        self.assertEqual(self.available(), 1)
+        self.assertEqual(self.available("cart1"), 3)
+
+        reservations.sync("cart1", {})
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_ignored_then_swept(self):
+        self.hold("old", 2, minutes=-1)
+        self.hold("live", 1)
+        self.assertEqual(self.available(), 2)
+        self.assertEqual(reservations.sweep_expired(), 1)
+        self.assertEqual(list(StockReservation.objects.values_list("cart_token", flat=True)), ["live"])
+
+    def test_catalog_and_detail_show_unheld_stock(self):
+        self.hold("other", 2)
+        results = self.client.get(reverse("core:catalog_api")).json()["results"]
+        self.assertEqual(results[0]["stock"], 1)
+        self.hold("another", 1)
+        self.assertEqual(self.client.get(reverse("core:catalog_api"), {"in_stock": "1"}).json()["results"], [])
+        detail = self.client.get(reverse("core:medicine_detail", args=[self.medicine.id]))
+        self.assertContains(detail, "Out of stock")
+
+    def test_checkout_rejects_stock_held_by_another_cart(self):
+        user = User.objects.create_user("customer", password="x")
+        self.client.force_login(user)
+        self.client.get(reverse("core:cart_add", args=[self.medicine.id]))
+        self.client.get(reverse("core:cart_add", args=[self.medicine.id]))
+        self.hold("other", 2)
+
+        response = self.client.post(reverse("core:checkout"), {
+            "full_name": "Test User", "phone": "9999999999", "address": "1 Test Street", "payment_method": "cod",
+        })
+        self.assertContains(response, "Not enough stock left for: Paracetamol")
+        self.assertFalse(Order.objects.exists())
+
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        self.paracetamol = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=3)
+        self.cetirizine = Medicine.objects.create(name="Cetirizine", price=Decimal("2.50"), stock=5)
+
+    def post(self, *changes):
+        return self.client.post(
+            reverse("core:cart_api"), json.dumps({"changes": list(changes)}), content_type="application/json"
+        ).json()
+
+    def test_quantities_are_clamped_to_stock(self):
+        data = self.post({"id": self.paracetamol.id, "qty": 5}, {"id": self.cetirizine.id, "qty": 2})
+
+        self.assertEqual(
+            [(line["id"], line["qty"]) for line in data["lines"]],
+            [(self.paracetamol.id, 3), (self.cetirizine.id, 2)],
+        )
+        self.assertEqual(data["total"], "35.00")
+        self.assertEqual([e["id"] for e in data["errors"]], [self.paracetamol.id])
+        self.assertEqual(StockReservation.objects.get(medicine=self.paracetamol).qty, 3)
+
+    def test_unknown_ids_are_reported(self):
+        data = self.post({"id": 9999, "qty": 1}, {"id": "x", "qty": 1})
+
+        self.assertEqual(data["lines"], [])
+        self.assertEqual([e["error"] for e in data["errors"]], ["Medicine not available."] * 2)
+
+    def test_qty_zero_and_negative_delta_remove_the_line(self):
+        self.post({"id": self.paracetamol.id, "qty": 2}, {"id": self.cetirizine.id, "qty": 1})
+        data = self.post({"id": self.paracetamol.id, "qty": 0}, {"id": self.cetirizine.id, "delta": -1})
+
+        self.assertEqual(data["lines"], [])
+        self.assertEqual(data["item_count"], 0)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.client.get(reverse("core:cart_api")).json()["lines"], [])
+
+
+class CatalogPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=3)
+
+    def test_pages_are_served_from_cache_until_the_catalog_changes(self):
+        url = reverse("core:medicine_detail", args=[self.medicine.id])
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        self.medicine.name = "Paracetamol 500"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medicine.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "Paracetamol 500")
+
+    def test_tracking_parameters_share_an_entry_and_users_bypass_it(self):
+        home = reverse("core:home")
+        self.client.get(home)
+        self.assertEqual(self.client.get(home, {"utm_source": "mail"})["X-Cache"], "HIT")
+
+        self.client.force_login(User.objects.create_user("customer", password="x"))
+        self.assertNotIn("X-Cache", self.client.get(home))
+
+
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("customer", password="x")
+        self.medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=3)
+        self.client.force_login(self.user)
+
+    def etags(self, *urls):
+        for url in urls:
+            self.client.get(url)  # sets the CSRF cookie, which is part of the ETag
+        return [self.client.get(url)["ETag"] for url in urls]
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_catalog_etag_follows_the_catalog_version(self):
+        url = reverse("core:home")
+        [etag] = self.etags(url)
+        self.assertEqual(self.revalidate(url, etag), 304)
+
+        bump_catalog_version()
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_order_etags_follow_order_changes(self):
+        order = place_order(self.user, [CartLine(self.medicine, 1)], **order_details())
+        urls = [reverse("core:my_orders"), reverse("core:order_detail", args=[order.id])]
+        etags = self.etags(*urls)
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag), 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_orders([order.id])
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag), 200)
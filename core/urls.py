@@ -6,6 +6,10 @@ app_name = "core"
 urlpatterns = [
     path("", views.home, name="home"),
     path("medicine/<int:pk>/", views.medicine_detail, name="medicine_detail"),
+    path("catalog/", views.catalog_api, name="catalog_api"),
+    path("autocomplete/", views.autocomplete_api, name="autocomplete"),
+    path("events/orders/", views.order_events, name="order_events"),
+    path("events/orders/changes/", views.order_changes, name="order_changes"),
     # cart
     path("cart/", views.cart_view, name="cart"),
     path("cart/add/<int:pk>/", views.cart_add, name="cart_add"),
@@ -14,8 +18,10 @@ urlpatterns = [
     path("cart/dec/<int:pk>/", views.cart_dec, name="cart_dec"),
     path("cart/update/<int:pk>/", views.cart_update, name="cart_update"),
     path("cart/clear/", views.cart_clear, name="cart_clear"),
+    path("cart/api/", views.cart_api, name="cart_api"),
     # checkout
     path("checkout/", views.checkout, name="checkout"),
+    path("checkout/processing/<int:intent_id>/", views.order_processing, name="order_processing"),
     # user orders tracking
     path("my-orders/", views.my_orders, name="my_orders"),
     path("my-orders/<int:order_id>/", views.order_detail, name="order_detail"),
@@ -26,6 +32,7 @@ urlpatterns = [
     path("profile/", views.profile_view, name="profile"),
     path("pay/<int:order_id>/", views.start_razorpay_payment, name="start_payment"),
     path("razorpay/callback/", views.razorpay_callback, name="razorpay_callback"),
+    path("razorpay/webhook/", views.razorpay_webhook, name="razorpay_webhook"),
     path("payment/failed/<int:order_id>/", views.payment_failed, name="payment_failed"),
     path("order/cancel/<int:order_id>/", views.cancel_order, name="cancel_order"),
 ]
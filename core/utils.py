@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def has_pending_messages(request):
+    # cookie storage first, then the session fallback used by FallbackStorage
+    if request.COOKIES.get(getattr(settings, "MESSAGE_COOKIE_NAME", "messages")):
+        return True
+    return "_messages" in request.session
@@ -3,46 +3,156 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponseBadRequest
-from django.db import transaction
-from .models import Medicine, Order, OrderItem
+from django.views.decorators.http import condition
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Medicine, Order, OrderIntent, OrderUnassignment
 from .models import Profile
+from .etags import (
+    catalog_etag,
+    my_orders_etag,
+    my_orders_last_modified,
+    order_etag,
+    order_last_modified,
+)
+from .page_cache import catalog_page_cache
+from .orders import OutOfStock, cancel_orders, find_replayed_order, place_order
+from .pagination import capped_count, keyset_page
+from .payments import GatewayError, GatewayUnavailable, get_gateway
+from .pricing import cart_totals, order_lines, price_cart, to_paise
+from .search import search_medicines
+from . import autocomplete, intake, reservations, webhooks
+from .events import hub
 from django.contrib import messages
-import razorpay
+import asyncio
+from datetime import timedelta
 import hashlib
 import hmac
+import json
+import re
+import uuid
 
 
-from django.db.models import Q
-
-def home(request):
+def _catalog_queryset(request):
     q = (request.GET.get("q") or "").strip()
     in_stock = request.GET.get("in_stock") == "1"
 
-    medicines = Medicine.objects.filter(is_active=True)
+    # stock not held by any live cart: what a shopper can still add. Not
+    # per cart, so anonymous pages stay shareable in the page cache
+    medicines = reservations.with_available(Medicine.objects.filter(is_active=True))
+    truncated = False
 
     if q:
-        medicines = medicines.filter(
-            Q(name__icontains=q)
-            # add more fields if you have them:
-            # | Q(brand__icontains=q)
-            # | Q(description__icontains=q)
-        )
+        # ranked full-text match over name, brand and description
+        medicines, truncated = search_medicines(medicines, q, in_stock=in_stock)
 
     if in_stock:
-        medicines = medicines.filter(stock__gt=0)
+        medicines = medicines.filter(available__gt=0)
+
+    # keyset ordering; "id" keeps it unique so cursors never skip rows
+    ordering = ("search_rank", "name", "id") if q else ("name", "id")
+    return medicines, ordering, q, in_stock, truncated
+
+
+def _catalog_page_size():
+    return getattr(settings, "CATALOG_PAGE_SIZE", 24)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag)
+@catalog_page_cache(params=("q", "in_stock", "cursor"))
+def home(request):
+    medicines, ordering, q, in_stock, truncated = _catalog_queryset(request)
+    cursor = request.GET.get("cursor")
 
-    medicines = medicines.order_by("name")
+    page, next_cursor = keyset_page(medicines, ordering, cursor, _catalog_page_size())
+    result_count, count_capped = capped_count(
+        medicines, getattr(settings, "CATALOG_COUNT_CAP", 1000)
+    )
+    # search keeps only its best SEARCH_MAX_RESULTS matches
+    count_capped = count_capped or truncated
 
     return render(
         request,
         "core/home.html",
-        {"medicines": medicines, "q": q, "in_stock": in_stock},
+        {
+            "medicines": page,
+            "q": q,
+            "in_stock": in_stock,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "result_count": result_count,
+            "count_capped": count_capped,
+        },
+    )
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag)
+@catalog_page_cache(params=("q", "in_stock", "cursor"))
+def catalog_api(request):
+    medicines, ordering, q, in_stock, truncated = _catalog_queryset(request)
+    cursor = request.GET.get("cursor")
+
+    page, next_cursor = keyset_page(
+        medicines.only("id", "name", "brand", "price", "stock", "image", "image_variants"),
+        ordering,
+        cursor,
+        _catalog_page_size(),
     )
 
+    data = {
+        "results": [
+            {
+                "id": m.id,
+                "name": m.name,
+                "brand": m.brand,
+                "price": str(m.price),
+                "stock": m.available,
+                "image": m.thumbnail_url or None,
+                "srcset": m.webp_srcset,
+                "url": reverse("core:medicine_detail", args=[m.id]),
+            }
+            for m in page
+        ],
+        "next": next_cursor,
+    }
+
+    # the count only matters for the first page; later pages stay index-only
+    if not cursor:
+        data["count"], data["count_capped"] = capped_count(
+            medicines, getattr(settings, "CATALOG_COUNT_CAP", 1000)
+        )
+        data["count_capped"] = data["count_capped"] or truncated
+
+    return JsonResponse(data)
+
+def autocomplete_api(request):
+    q = (request.GET.get("q") or "").strip()
+    max_limit = getattr(settings, "AUTOCOMPLETE_LIMIT", 10)
+    try:
+        limit = min(max(int(request.GET.get("limit", max_limit)), 1), max_limit)
+    except ValueError:
+        limit = max_limit
+
+    results = [
+        {"id": pk, "name": name, "url": reverse("core:medicine_detail", args=[pk])}
+        for pk, name in autocomplete.suggest(q, limit)
+    ] if q else []
+
+    return JsonResponse({"results": results})
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag)
+@catalog_page_cache()
 def medicine_detail(request, pk):
-    med = get_object_or_404(Medicine, pk=pk, is_active=True)
+    med = get_object_or_404(reservations.with_available(Medicine.objects.filter(is_active=True)), pk=pk)
     return render(request, "core/medicine_detail.html", {"med": med})
 
 from django.shortcuts import get_object_or_404, redirect, render
@@ -58,21 +168,29 @@ def _get_cart(session):
 def _save_cart(session, cart):
     session["cart"] = cart
     session.modified = True
+    # every cart write refreshes this cart's stock holds
+    reservations.sync(reservations.cart_token(session), cart)
+
+
+def _available_medicines(session):
+    # active medicines annotated with stock not held by other carts
+    token = reservations.cart_token(session)
+    return reservations.with_available(Medicine.objects.filter(is_active=True), token)
 
 
 def cart_add(request, pk):
-    med = get_object_or_404(Medicine, pk=pk, is_active=True)
+    med = get_object_or_404(_available_medicines(request.session), pk=pk)
     cart = _get_cart(request.session)
 
-    if med.stock <= 0:
+    if med.available <= 0:
         messages.error(request, f"{med.name} is out of stock.")
         return redirect("core:medicine_detail", pk=med.id)
 
     key = str(med.id)
     current_qty = cart.get(key, {}).get("qty", 0)
 
-    if current_qty + 1 > med.stock:
-        messages.warning(request, f"Only {med.stock} items available for {med.name}.")
+    if current_qty + 1 > med.available:
+        messages.warning(request, f"Only {med.available} items available for {med.name}.")
         return redirect("core:cart")
 
     cart[key] = {"qty": current_qty + 1}
@@ -94,18 +212,18 @@ def cart_remove(request, pk):
 
 
 def cart_inc(request, pk):
-    med = get_object_or_404(Medicine, pk=pk, is_active=True)
+    med = get_object_or_404(_available_medicines(request.session), pk=pk)
     cart = _get_cart(request.session)
 
-    if med.stock <= 0:
+    if med.available <= 0:
         messages.error(request, f"{med.name} is out of stock.")
         return redirect("core:cart")
 
     key = str(med.id)
     current_qty = cart.get(key, {}).get("qty", 0)
 
-    if current_qty + 1 > med.stock:
-        messages.warning(request, f"Only {med.stock} items available for {med.name}.")
+    if current_qty + 1 > med.available:
+        messages.warning(request, f"Only {med.available} items available for {med.name}.")
         return redirect("core:cart")
 
     cart[key] = {"qty": current_qty + 1}
@@ -136,7 +254,7 @@ def cart_dec(request, pk):
 
 @require_POST
 def cart_update(request, pk):
-    med = get_object_or_404(Medicine, pk=pk, is_active=True)
+    med = get_object_or_404(_available_medicines(request.session), pk=pk)
     cart = _get_cart(request.session)
     key = str(med.id)
 
@@ -151,15 +269,15 @@ def cart_update(request, pk):
         messages.info(request, f"{med.name} removed from cart.")
         return redirect("core:cart")
 
-    if med.stock <= 0:
+    if med.available <= 0:
         cart.pop(key, None)
         _save_cart(request.session, cart)
         messages.error(request, f"{med.name} is out of stock now.")
         return redirect("core:cart")
 
-    if qty > med.stock:
-        qty = med.stock
-        messages.warning(request, f"Only {med.stock} items available for {med.name}. Quantity adjusted.")
+    if qty > med.available:
+        qty = med.available
+        messages.warning(request, f"Only {med.available} items available for {med.name}. Quantity adjusted.")
 
     cart[key] = {"qty": qty}
     _save_cart(request.session, cart)
@@ -174,45 +292,152 @@ def cart_clear(request):
     return redirect("core:cart")
 
 
-def cart_view(request):
+def _parse_qty(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cart_payload(cart, meds_map):
+    totals = price_cart(cart, meds_map)
+    lines = [
+        {
+            "id": line.medicine.id,
+            "name": line.medicine.name,
+            "price": str(line.unit_price),
+            "qty": line.qty,
+            "stock": line.medicine.available,
+            "subtotal": str(line.subtotal),
+        }
+        for line in totals.lines
+    ]
+    return {"lines": lines, "total": str(totals.grand_total), "item_count": totals.item_count}
+
+
+def cart_api(request):
+    """
+    GET returns the cart; POST applies many line changes at once.
+
+    The POST body is JSON: ``{"changes": [{"id": 3, "qty": 2}, {"id": 5, "delta": -1}]}``.
+    ``qty`` sets the quantity, ``delta`` adjusts it, and anything that ends at
+    zero or below is removed. Quantities are clamped to the stock not held
+    by other carts.
+    """
     cart = _get_cart(request.session)
-    ids = [int(k) for k in cart.keys()] if cart else []
-    meds = Medicine.objects.filter(id__in=ids)
+    errors = []
+
+    if request.method == "POST":
+        try:
+            changes = json.loads(request.body or b"{}").get("changes", [])
+            if not isinstance(changes, list):
+                raise ValueError
+        except (ValueError, AttributeError):
+            return JsonResponse({"error": "Expected a JSON body with a list of changes."}, status=400)
+
+        change_ids = {_parse_qty(c.get("id")) for c in changes if isinstance(c, dict)}
+        change_ids.discard(None)
+    elif request.method == "GET":
+        changes, change_ids = [], set()
+    else:
+        return JsonResponse({"error": "Method not allowed."}, status=405)
 
-    items = []
-    total = 0
+    # one query validates every change and prices every line
+    ids = change_ids | {int(k) for k in cart.keys()}
+    meds_map = {m.id: m for m in _available_medicines(request.session).filter(id__in=ids)}
 
-    # keep original cart order (nice UX)
-    meds_map = {m.id: m for m in meds}
-    for key in cart.keys():
-        mid = int(key)
+    for change in changes:
+        if not isinstance(change, dict):
+            continue
+        mid = _parse_qty(change.get("id"))
+        key = str(mid)
         m = meds_map.get(mid)
-        if not m:
+        if m is None:
+            cart.pop(key, None)
+            errors.append({"id": mid, "error": "Medicine not available."})
+            continue
+
+        current_qty = cart.get(key, {}).get("qty", 0)
+        if "qty" in change:
+            qty = _parse_qty(change["qty"])
+        else:
+            delta = _parse_qty(change.get("delta", 0))
+            qty = None if delta is None else current_qty + delta
+        if qty is None:
+            errors.append({"id": mid, "error": "Quantity must be a whole number."})
             continue
-        qty = cart[str(m.id)]["qty"]
-        subtotal = float(m.price) * qty
-        total += subtotal
-        items.append({"medicine": m, "qty": qty, "subtotal": subtotal})
 
-    return render(request, "core/cart.html", {"items": items, "total": total})
+        if qty <= 0:
+            cart.pop(key, None)
+            continue
+        if m.available <= 0:
+            cart.pop(key, None)
+            errors.append({"id": mid, "error": f"{m.name} is out of stock."})
+            continue
+        if qty > m.available:
+            qty = m.available
+            errors.append({"id": mid, "error": f"Only {m.available} items available for {m.name}. Quantity adjusted."})
+
+        cart[key] = {"qty": qty}
+
+    if changes:
+        _save_cart(request.session, cart)
+
+    data = _cart_payload(cart, meds_map)
+    data["errors"] = errors
+    return JsonResponse(data)
+
+
+def cart_view(request):
+    # lines keep the original cart order (nice UX)
+    totals = cart_totals(_get_cart(request.session), _available_medicines(request.session))
+    return render(request, "core/cart.html", {"items": totals.lines, "total": totals.grand_total})
+
+IDEMPOTENCY_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def _idempotency_key(request):
+    key = request.POST.get("idempotency_key", "")
+    return key if IDEMPOTENCY_KEY_RE.match(key) else None
+
+
+def _finish_checkout(request, order):
+    # stock is now decremented, so this cart's holds can go
+    reservations.release(reservations.cart_token(request.session))
+
+    if order.payment_method == "razorpay" and not order.is_paid:
+        return redirect("core:start_payment", order_id=order.id)
+
+    # clear cart
+    _save_cart(request.session, {})
+
+    return render(request, "core/order_success.html", {"order": order})
+
 
 @login_required
 def checkout(request):
+    idempotency_key = _idempotency_key(request) if request.method == "POST" else None
+
+    # a double submit or network retry gets the order the first request made
+    replayed = find_replayed_order(request.user, idempotency_key)
+    if replayed:
+        return _finish_checkout(request, replayed)
+
     cart = _get_cart(request.session)
     if not cart:
         return redirect("core:cart")
 
-    ids = [int(k) for k in cart.keys()]
-    meds = Medicine.objects.filter(id__in=ids)
+    # priced against stock not held by other live carts
+    totals = cart_totals(cart, _available_medicines(request.session))
+    items = totals.lines
+    grand_total = totals.grand_total
+    if not items:
+        return redirect("core:cart")
 
-    # build totals
-    items = []
-    grand_total = 0
-    for m in meds:
-        qty = cart[str(m.id)]["qty"]
-        subtotal = float(m.price) * qty
-        grand_total += subtotal
-        items.append((m, qty, subtotal))
+    short = [line.medicine.name for line in items if line.qty > line.medicine.available]
+    stock_error = (
+        "Not enough stock left for: " + ", ".join(short) + ". Please update your cart." if short else None
+    )
 
     profile = Profile.objects.get(user=request.user)
     initial_full_name = request.user.get_full_name() or request.user.username
@@ -232,37 +457,72 @@ def checkout(request):
                 {
                     "items": items,
                     "grand_total": grand_total,
+                    "idempotency_key": idempotency_key or uuid.uuid4().hex,
                     "error": "All fields are required.",
                 },
             )
         if payment_method not in ["cod", "razorpay"]:
             payment_method = "cod"
 
-        order = Order.objects.create(
-            user=request.user,
-            full_name=full_name,
-            phone=phone,
-            address=address,
-            status="placed",
-            payment_method=payment_method,
-            is_paid=(payment_method == "cod")
-            and False,  # COD is unpaid until delivered
-        )
-
-        for m, qty, subtotal in items:
-            OrderItem.objects.create(order=order, medicine=m, qty=qty, price=m.price)
-            # reduce stock (basic)
-            if m.stock >= qty:
-                m.stock -= qty
-                m.save()
-
-        if payment_method == "razorpay":
-            return redirect("core:start_payment", order_id=order.id)
+        if stock_error:
+            return render(
+                request,
+                "core/checkout.html",
+                {
+                    "items": items,
+                    "grand_total": grand_total,
+                    "initial_full_name": full_name,
+                    "initial_phone": phone,
+                    "initial_address": address,
+                    "idempotency_key": idempotency_key or uuid.uuid4().hex,
+                    "error": stock_error,
+                },
+            )
 
-        # clear cart
-        _save_cart(request.session, {})
+        if intake.enabled():
+            # a worker places the order; the processing page polls for it
+            intent = intake.enqueue(
+                request.user,
+                cart,
+                cart_token=reservations.cart_token(request.session),
+                idempotency_key=idempotency_key or uuid.uuid4().hex,
+                full_name=full_name,
+                phone=phone,
+                address=address,
+                payment_method=payment_method,
+            )
+            return redirect("core:order_processing", intent_id=intent.id)
+
+        try:
+            # one transaction: bulk item insert + conditional stock decrement
+            order = place_order(
+                request.user,
+                items,
+                full_name=full_name,
+                phone=phone,
+                address=address,
+                payment_method=payment_method,
+                idempotency_key=idempotency_key,
+            )
+        except OutOfStock as exc:
+            return render(
+                request,
+                "core/checkout.html",
+                {
+                    "items": items,
+                    "grand_total": grand_total,
+                    "initial_full_name": full_name,
+                    "initial_phone": phone,
+                    "initial_address": address,
+                    "idempotency_key": idempotency_key or uuid.uuid4().hex,
+                    "error": (
+                        "Not enough stock left for: " + ", ".join(exc.names)
+                        + ". Please update your cart."
+                    ),
+                },
+            )
 
-        return render(request, "core/order_success.html", {"order": order})
+        return _finish_checkout(request, order)
 
     return render(
         request,
@@ -273,38 +533,48 @@ def checkout(request):
             "initial_full_name": initial_full_name,
             "initial_phone": initial_phone,
             "initial_address": initial_address,
+            "idempotency_key": uuid.uuid4().hex,
+            "error": stock_error,
         },
     )
 
 
 @login_required
+@cache_control(private=True, no_store=True)
+def order_processing(request, intent_id):
+    intent = get_object_or_404(OrderIntent, id=intent_id, user=request.user)
+
+    if intent.status == "done" and intent.order:
+        return _finish_checkout(request, intent.order)
+
+    if intent.status == "failed":
+        messages.error(request, intent.error or "We could not place your order.")
+        return redirect("core:cart")
+
+    return render(request, "core/order_processing.html", {"intent": intent})
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=my_orders_etag, last_modified_func=my_orders_last_modified)
 def my_orders(request):
     orders = Order.objects.filter(user=request.user).order_by("-created_at")
     return render(request, "core/my_orders.html", {"orders": orders})
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=order_etag, last_modified_func=order_last_modified)
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    item_rows = []
-    order_total = 0
-
-    for item in order.items.select_related("medicine").all():
-        line_total = float(item.price) * item.qty
-        order_total += line_total
-        item_rows.append({
-            "obj": item,
-            "line_total": line_total,
-        })
-
     return render(
         request,
         "core/order_detail.html",
         {
             "order": order,
-            "order_total": order_total,
-            "item_rows": item_rows,
+            "order_total": order.total_amount,
+            "items": order_lines(order),
         },
     )
 
@@ -381,29 +651,30 @@ def start_razorpay_payment(request, order_id):
     if order.is_paid:
         return redirect("core:order_detail", order_id=order.id)
 
-    client = razorpay.Client(
-        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-    )
+    # COD orders (e.g. reached by a direct URL) stay COD; cancelled ones can't be paid
+    if order.payment_method != "razorpay" or order.status == "cancelled":
+        messages.error(request, "This order can't be paid online.")
+        return redirect("core:order_detail", order_id=order.id)
 
     # Razorpay amount is in paise
-    # You should compute total from OrderItems; here we assume you can calculate it
-    total_rupees = sum([item.qty * float(item.price) for item in order.items.all()])
-    amount = int(total_rupees)
-    amount_paise = int(total_rupees * 100)
-    
+    total_rupees = order.total_amount
+    amount_paise = to_paise(total_rupees)
 
-    rp_order = client.order.create(
-        {
-            "amount": amount_paise,
-            "currency": "INR",
-            "payment_capture": 1,  # auto-capture (recommended)
-            "receipt": f"app_order_{order.id}",
-            "notes": {"app_order_id": str(order.id)},
-        }
-    )  # create Order on server :contentReference[oaicite:3]{index=3}
+    gateway = get_gateway()
+    try:
+        rp_order = gateway.create_order(
+            amount_paise,
+            receipt=f"app_order_{order.id}",
+            notes={"app_order_id": str(order.id)},
+        )
+    except GatewayUnavailable:
+        messages.error(request, "Payments are temporarily unavailable. Please try again in a few minutes.")
+        return redirect("core:order_detail", order_id=order.id)
+    except GatewayError:
+        messages.error(request, "We couldn't start the payment. Please try again.")
+        return redirect("core:order_detail", order_id=order.id)
 
     order.razorpay_order_id = rp_order["id"]
-    order.payment_method = "razorpay"
     order.save()
 
     return render(
@@ -411,8 +682,9 @@ def start_razorpay_payment(request, order_id):
         "core/razorpay_checkout.html",
         {
             "order": order,
-            "razorpay_key_id": settings.RAZORPAY_KEY_ID,
-            "amount": amount,
+            "razorpay_key_id": gateway.key_id,
+            "amount_rupees": total_rupees,
+            "amount_paise": amount_paise,
             "customer_name": order.full_name,
             "customer_phone": order.phone,
         },
@@ -441,7 +713,7 @@ def razorpay_callback(request):
         hashlib.sha256,
     ).hexdigest()
 
-    if generated_signature != razorpay_signature:
+    if not hmac.compare_digest(generated_signature, razorpay_signature or ""):
         messages.error(request, "Payment verification failed.")
         return redirect("core:order_detail", order_id=order.id)
 
@@ -454,6 +726,21 @@ def razorpay_callback(request):
     messages.success(request, "Payment successful!")
     return redirect("core:order_detail", order_id=order.id)
 
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    # store only; process_payment_events applies events to orders
+    signature = request.headers.get("X-Razorpay-Signature", "")
+    if not webhooks.verify_signature(request.body, signature, settings.RAZORPAY_WEBHOOK_SECRET):
+        return HttpResponseBadRequest("Invalid signature")
+
+    try:
+        webhooks.record_event(request.body, request.headers.get("X-Razorpay-Event-Id"))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid payload")
+    return JsonResponse({"status": "ok"})
+
+
 @login_required
 def payment_failed(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
@@ -467,19 +754,87 @@ def cancel_order(request, order_id):
     if request.method != "POST":
         return redirect("core:order_detail", order_id=order.id)
 
-    if order.status in ["shipped", "delivered", "cancelled"]:
+    # set-based: one status UPDATE plus one stock UPDATE for all lines
+    if not cancel_orders([order.id]):
         messages.error(request, "Order cannot be cancelled at this stage.")
         return redirect("core:order_detail", order_id=order.id)
 
-    with transaction.atomic():
-        # Restore stock
-        for item in order.items.all():
-            item.medicine.stock += item.qty
-            item.medicine.save()
-
-        order.status = "cancelled"
-        order.save()
-
     messages.success(request, "Order cancelled successfully.")
     return redirect("core:order_detail", order_id=order.id)
 
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+async def _order_event_stream(accepts):
+    sub = hub.subscribe(accepts)
+    try:
+        yield "retry: 5000\n\n"
+        while not sub.overflowed:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), SSE_HEARTBEAT_SECONDS)
+            except TimeoutError:
+                # comment line keeps proxies from closing an idle stream
+                yield ": ping\n\n"
+                continue
+            yield f"event: order\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        # fell behind; the page reloads instead of missing events
+        yield "event: resync\ndata: {}\n\n"
+    finally:
+        hub.unsubscribe(sub)
+
+
+async def order_events(request):
+    # server-sent events need the ASGI app (config/asgi.py); under WSGI the
+    # 204 tells EventSource to stop reconnecting and the page falls back to
+    # polling order_changes
+    if not getattr(settings, "ORDER_EVENTS_STREAM", False) or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    role = await Profile.objects.filter(user_id=user.pk).values_list("role", flat=True).afirst()
+
+    if role == "admin":
+        accepts = None
+    elif role == "delivery":
+        # their own orders, plus ones just reassigned away from them
+        def accepts(event):
+            return user.pk in (event["delivery_id"], event["previous_delivery_id"])
+    else:
+        return HttpResponseForbidden()
+
+    response = StreamingHttpResponse(_order_event_stream(accepts), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+def order_changes(request):
+    """
+    Polling fallback for the live dashboards: how many of the caller's
+    orders changed since ``since``, and the ``since`` to send next time.
+    """
+    role = getattr(getattr(request.user, "profile", None), "role", None)
+    if role not in ("admin", "delivery"):
+        return HttpResponseForbidden()
+
+    # updated_at is stamped before commit; stop short of rows that may still land
+    settled = timezone.now() - timedelta(seconds=getattr(settings, "DELIVERY_SYNC_SETTLE_SECONDS", 5))
+    since = parse_datetime(request.GET.get("since") or "")
+    if since is None or timezone.is_naive(since):
+        return JsonResponse({"changed": 0, "since": settled.isoformat()})
+    if since >= settled:
+        return JsonResponse({"changed": 0, "since": since.isoformat()})
+
+    orders = Order.objects.filter(updated_at__gt=since, updated_at__lte=settled)
+    changed = 0
+    if role == "delivery":
+        orders = orders.filter(assigned_delivery=request.user)
+        changed = OrderUnassignment.objects.filter(
+            delivery_user=request.user, created_at__gt=since, created_at__lte=settled
+        ).count()
+    changed += orders.count()
+    return JsonResponse({"changed": changed, "since": settled.isoformat()})
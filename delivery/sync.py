@@ -0,0 +1,142 @@
+"""
+Delta sync for delivery clients.
+
+A client holds an opaque cursor and asks for what changed since it: orders
+assigned to the user whose ``updated_at`` moved past the cursor (read
+through the ``(assigned_delivery, updated_at)`` index) and the ids of orders
+taken off the user meanwhile (``OrderUnassignment``). Assigning,
+reassigning and status changes all bump ``updated_at``, so a sync reads the
+rows that changed and nothing else. Without a cursor (or with one older
+than the unassignment retention window) the client gets its open orders and
+a fresh cursor instead.
+
+Rows are only handed out once they are ``DELIVERY_SYNC_SETTLE_SECONDS``
+old: ``updated_at`` is stamped before the writing transaction commits, so a
+row stamped just before the cursor could otherwise become visible after the
+client moved past it. Code that writes orders therefore stamps
+``updated_at`` right before its write and commits straight after (long jobs
+such as ``auto_assign`` commit per chunk); a transaction that stays open
+longer than the settle window after stamping can be missed. Clients should
+treat both lists as upserts/deletes by id, since rows at the cursor edge can
+be sent twice.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import Order, OrderUnassignment
+from core.pagination import decode_cursor, encode_cursor, keyset_after
+
+SNAPSHOT_STATUSES = ("placed", "packed", "shipped")
+
+ORDER_KEY = ("updated_at", "id")
+REMOVED_KEY = ("created_at", "id")
+
+ORDER_FIELDS = (
+    "id", "status", "is_paid", "payment_method", "total_amount", "item_count",
+    "full_name", "phone", "address", "created_at", "updated_at", "assigned_delivery",
+)
+
+
+def order_payload(order):
+    return {
+        "id": order.id,
+        "status": order.status,
+        "paid": order.is_paid,
+        "payment": order.payment_method,
+        "total": str(order.total_amount),
+        "items": order.item_count,
+        "name": order.full_name,
+        "phone": order.phone,
+        "address": order.address,
+        "created": order.created_at.isoformat(),
+        "updated": order.updated_at.isoformat(),
+    }
+
+
+def _encode(order_pos, removed_pos):
+    # isoformat by hand: DjangoJSONEncoder would cut timestamps to milliseconds
+    return encode_cursor([order_pos[0].isoformat(), order_pos[1], removed_pos[0].isoformat(), removed_pos[1]])
+
+
+def _settle_window():
+    return timedelta(seconds=getattr(settings, "DELIVERY_SYNC_SETTLE_SECONDS", 5))
+
+
+def _decode(cursor, settled):
+    """Both cursor positions, or ``None`` if the cursor wasn't one we issued."""
+    values = decode_cursor(cursor, 4)
+    if values is None:
+        return None
+    positions = []
+    for ts, pk in (values[:2], values[2:]):
+        try:
+            ts = parse_datetime(ts)
+        except (TypeError, ValueError):
+            return None
+        # we only issue aware timestamps no later than the settle point
+        if ts is None or timezone.is_naive(ts) or ts > settled:
+            return None
+        if not isinstance(pk, int) or isinstance(pk, bool) or pk < 0:
+            return None
+        positions.append((ts, pk))
+    return positions
+
+
+def _page(queryset, key, position, settled, size):
+    """Rows after ``position`` up to ``settled``, and where the next call should start."""
+    rows = list(
+        queryset.filter(**{f"{key[0]}__lte": settled})
+        .filter(keyset_after(key, position))
+        .order_by(*key)[: size + 1]
+    )
+    more = len(rows) > size
+    rows = rows[:size]
+    if rows:
+        position = (getattr(rows[-1], key[0]), rows[-1].id)
+    if not more:
+        # drained: skip ahead so an idle stream doesn't age out of retention
+        position = max(position, (settled, 0))
+    return rows, position, more
+
+
+def changes(user, cursor=None, size=None):
+    """
+    ``{"orders", "removed", "cursor", "more", "reset"}`` for ``user`` since
+    ``cursor``. ``reset`` means the client should replace its local list
+    with ``orders``; ``more`` means it should call again right away.
+    """
+    size = size or getattr(settings, "DELIVERY_SYNC_PAGE_SIZE", 200)
+    now = timezone.now()
+    settled = now - _settle_window()
+    retention = timedelta(days=getattr(settings, "DELIVERY_SYNC_RETENTION_DAYS", 30))
+    mine = Order.objects.filter(assigned_delivery=user).only(*ORDER_FIELDS)
+
+    positions = _decode(cursor, settled)
+    if positions is None or positions[1][0] < now - retention:
+        orders = mine.filter(status__in=SNAPSHOT_STATUSES).order_by("created_at", "id")
+        return {
+            "orders": [order_payload(o) for o in orders],
+            "removed": [],
+            "cursor": _encode((settled, 0), (settled, 0)),
+            "more": False,
+            "reset": True,
+        }
+
+    orders, order_pos, more_orders = _page(mine, ORDER_KEY, positions[0], settled, size)
+    removed = (
+        OrderUnassignment.objects.filter(delivery_user=user)
+        # handed back to this user since: it is in ``orders`` instead
+        .exclude(order__assigned_delivery=user)
+        .only("id", "order_id", "created_at")
+    )
+    removed, removed_pos, more_removed = _page(removed, REMOVED_KEY, positions[1], settled, size)
+    return {
+        "orders": [order_payload(o) for o in orders],
+        "removed": list(dict.fromkeys(r.order_id for r in removed)),
+        "cursor": _encode(order_pos, removed_pos),
+        "more": more_orders or more_removed,
+        "reset": False,
+    }
@@ -1,3 +1,140 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import stats
+from core.models import Medicine, Order, OrderDailyStat
+from core.orders import place_order
+from core.pagination import encode_cursor
+from core.pricing import CartLine
+
+from adminapp.assignment import assign_orders
+
+from . import transitions, views
+
+
+class AdvanceOrdersTests(TestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user("rider", password="x")
+        self.rider.profile.role = "delivery"
+        self.rider.profile.save()
+        customer = User.objects.create_user("customer", password="x")
+        medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+        self.order = place_order(
+            customer, [CartLine(medicine, 1)],
+            full_name="Test User", phone="9999999999", address="1 Test Street", payment_method="cod",
+        )
+        self.order.assigned_delivery = self.rider
+        self.order.save()
+        self.client.force_login(self.rider)
+
+    def test_duplicate_ids_move_and_count_the_order_once(self):
+        response = self.client.post(
+            reverse("delivery:delivery_advance_orders"),
+            json.dumps({"order_ids": [self.order.id, self.order.id]}),
+            content_type="application/json",
+        )
+
+        data = response.json()
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual([r["status"] for r in data["results"]], ["packed"])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "packed")
+        counts = dict(OrderDailyStat.objects.values_list("status", "order_count"))
+        self.assertEqual(counts, {"placed": 0, "packed": 1})
+        self.assertEqual(stats.rebuild(), 1)
+
+    def test_oversized_batch_is_rejected(self):
+        ids = list(range(1, views.MAX_BATCH_SIZE + 2))
+        response = self.client.post(
+            reverse("delivery:delivery_advance_orders"), json.dumps({"order_ids": ids}), content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "placed")
+
+    def test_single_update_uses_the_shared_transition_rules(self):
+        url = reverse("delivery:delivery_update_status", args=[self.order.id])
+
+        self.client.post(url, {"status": "shipped"})
+        self.client.post(url, {})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "placed")
+
+        self.client.post(url, {"status": "packed"})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "packed")
+        counts = dict(OrderDailyStat.objects.values_list("status", "order_count"))
+        self.assertEqual(counts, {"placed": 0, "packed": 1})
+
+    def test_order_moved_by_a_concurrent_request_is_not_counted_again(self):
+        other = place_order(
+            self.order.user, [CartLine(self.order.items.first().medicine, 1)],
+            full_name="Test User", phone="9999999999", address="1 Test Street", payment_method="cod",
+        )
+        Order.objects.filter(pk=other.pk).update(assigned_delivery=self.rider)
+        real_check = transitions.transition_error
+
+        def racing_check(order, new_status=None):
+            # another request moves this order after our locked read
+            if order.pk == self.order.pk:
+                stats.record_transition([Order.objects.get(pk=order.pk)], "packed")
+                Order.objects.filter(pk=order.pk).update(status="packed")
+            return real_check(order, new_status)
+
+        with mock.patch.object(transitions, "transition_error", racing_check):
+            results = transitions.advance_orders(self.rider, [self.order.id, other.id])
+
+        self.assertEqual([r["ok"] for r in results], [False, True])
+        counts = dict(OrderDailyStat.objects.values_list("status", "order_count"))
+        self.assertEqual(counts, {"placed": 0, "packed": 2})
+
+
+@override_settings(DELIVERY_SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user("rider", password="x")
+        self.rider.profile.role = "delivery"
+        self.rider.profile.save()
+        self.other_rider = User.objects.create_user("other", password="x")
+        customer = User.objects.create_user("customer", password="x")
+        medicine = Medicine.objects.create(name="Paracetamol", price=Decimal("10.00"), stock=10)
+        self.order = place_order(
+            customer, [CartLine(medicine, 1)],
+            full_name="Test User", phone="9999999999", address="1 Test Street", payment_method="cod",
+        )
+        self.client.force_login(self.rider)
+
+    def sync(self, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        return self.client.get(reverse("delivery:delivery_sync"), params).json()
+
+    def test_assignment_and_reassignment_show_up_in_the_delta(self):
+        cursor = self.sync()["cursor"]
+
+        assign_orders([self.order.id], self.rider)
+        data = self.sync(cursor)
+        self.assertFalse(data["reset"])
+        self.assertEqual([o["id"] for o in data["orders"]], [self.order.id])
+
+        assign_orders([self.order.id], self.other_rider)
+        data = self.sync(data["cursor"])
+        self.assertEqual(data["orders"], [])
+        self.assertEqual(data["removed"], [self.order.id])
+
+        data = self.sync(data["cursor"])
+        self.assertEqual((data["orders"], data["removed"]), ([], []))
+
+    def test_naive_or_future_cursor_gets_a_snapshot(self):
+        naive = timezone.now().replace(tzinfo=None).isoformat()
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        for stamp in (naive, future):
+            data = self.sync(encode_cursor([stamp, 0, stamp, 0]))
+            self.assertTrue(data["reset"], stamp)
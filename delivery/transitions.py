@@ -0,0 +1,110 @@
+"""
+Order status progression for delivery staff.
+
+Orders move strictly one step along ``NEXT_STATUS``. ``advance_orders``
+moves many orders at once with one ``UPDATE ... WHERE status = <source>``
+per source status, so an order changed by someone else in the meantime is
+simply not matched instead of being moved twice. When fewer rows match than
+expected, that UPDATE is rolled back and redone row by row, so only the
+rows this call changed are reported and counted.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from core import stats
+from core.events import publish_orders
+from core.models import Order
+
+# Strict next-step progression
+NEXT_STATUS = {
+    "placed": "packed",
+    "packed": "shipped",
+    "shipped": "delivered",
+}
+
+
+class _Contended(Exception):
+    pass
+
+
+def transition_error(order, new_status=None):
+    """Why ``order`` can't move (to ``new_status`` if given), or ``None`` if it can."""
+    if order.status == "cancelled":
+        return "Cancelled orders cannot be updated."
+    if order.status == "delivered":
+        return "This order is already delivered."
+    # Prevent delivery updates if Razorpay payment not completed
+    if order.payment_method == "razorpay" and not order.is_paid:
+        return "Cannot update status until payment is completed."
+    expected_next = NEXT_STATUS.get(order.status)
+    if not expected_next:
+        return "Invalid current order status."
+    if new_status is not None and new_status != expected_next:
+        return f"Invalid update. From '{order.status}' you can only move to '{expected_next}'."
+    return None
+
+
+def advance_orders(delivery_user, order_ids, new_status=None):
+    """
+    Move each of ``delivery_user``'s orders in ``order_ids`` one step (only
+    those whose next step is ``new_status``, when given). Returns
+    ``[{"id", "ok", "status", "error"}]`` in the order of ``order_ids``, once
+    per id.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    results = {}
+    with transaction.atomic():
+        orders = {
+            o.pk: o
+            for o in Order.objects.select_for_update()
+            .filter(pk__in=order_ids, assigned_delivery=delivery_user)
+            .only("pk", "status", "payment_method", "is_paid", "created_at", "total_amount", "assigned_delivery")
+        }
+
+        by_source = defaultdict(list)
+        for pk in order_ids:
+            order = orders.get(pk)
+            if order is None:
+                results[pk] = {"id": pk, "ok": False, "status": None, "error": "Order not found."}
+                continue
+            error = transition_error(order, new_status)
+            if error:
+                results[pk] = {"id": pk, "ok": False, "status": order.status, "error": error}
+            else:
+                by_source[order.status].append(order)
+
+        for source, group in by_source.items():
+            target = NEXT_STATUS[source]
+            ids = [o.pk for o in group]
+            changes = {"status": target, "updated_at": timezone.now()}
+            if target == "delivered":
+                # COD is paid on delivery
+                changes["is_paid"] = Case(When(payment_method="cod", then=Value(True)), default=F("is_paid"))
+            mine = Order.objects.filter(assigned_delivery=delivery_user, status=source)
+            try:
+                with transaction.atomic():
+                    if mine.filter(pk__in=ids).update(**changes) != len(group):
+                        raise _Contended
+                moved = group
+            except _Contended:
+                # someone moved some of these meanwhile (SQLite has no row
+                # locks): redo row by row so only rows changed here count
+                moved = []
+                for o in group:
+                    if mine.filter(pk=o.pk).update(**changes) == 1:
+                        moved.append(o)
+                    else:
+                        results[o.pk] = {"id": o.pk, "ok": False, "status": None, "error": "Order changed meanwhile."}
+
+            stats.record_transition(moved, target)
+            for o in moved:
+                o.status = target
+                if target == "delivered" and o.payment_method == "cod":
+                    o.is_paid = True
+                results[o.pk] = {"id": o.pk, "ok": True, "status": target, "error": None}
+            publish_orders(moved, "status")
+
+    return [results[pk] for pk in order_ids]
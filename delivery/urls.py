@@ -7,5 +7,7 @@ urlpatterns = [
     path("", views.delivery_dashboard, name="delivery_dashboard"),
     path("order/<int:order_id>/", views.delivery_order_detail, name="delivery_order_detail"),
     path("order/<int:order_id>/status/", views.delivery_update_status, name="delivery_update_status"),
+    path("orders/advance/", views.delivery_advance_orders, name="delivery_advance_orders"),
+    path("sync/", views.delivery_sync, name="delivery_sync"),
     path("login/", views.delivery_login, name="delivery_login"),
 ]
\ No newline at end of file
@@ -1,14 +1,56 @@
 from django.shortcuts import redirect, render
 from django.shortcuts import get_object_or_404
+from django.http import JsonResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from .utils import delivery_required
-from core.models import Order
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch, Q
+from core.models import Order, OrderItem
+from .sync import changes
+from .transitions import advance_orders, transition_error
+import json
+
+ACTIVE_STATUSES = ("placed", "packed", "shipped")
+DONE_STATUSES = ("delivered", "cancelled")
+
 
 @delivery_required
 def delivery_dashboard(request):
-    orders = Order.objects.filter(assigned_delivery=request.user).order_by("-created_at")
-    return render(request, "delivery/delivery_dashboard.html", {"orders": orders})
+    view = "history" if request.GET.get("view") == "history" else "active"
+    # every query below is served by the (assigned_delivery, status, created_at) index
+    mine = Order.objects.filter(assigned_delivery=request.user)
+    counts = mine.aggregate(
+        active=Count("id", filter=Q(status__in=ACTIVE_STATUSES)),
+        done=Count("id", filter=Q(status__in=DONE_STATUSES)),
+    )
+    items = Prefetch(
+        "items",
+        queryset=OrderItem.objects.select_related("medicine").only("order", "qty", "medicine__name").order_by("id"),
+    )
+
+    page = None
+    if view == "active":
+        orders = mine.filter(status__in=ACTIVE_STATUSES).prefetch_related(items).order_by("-created_at")
+    else:
+        paginator = Paginator(
+            mine.filter(status__in=DONE_STATUSES).prefetch_related(items).order_by("-created_at", "-id"),
+            getattr(settings, "DELIVERY_HISTORY_PER_PAGE", 25),
+        )
+        paginator.count = counts["done"]
+        page = paginator.get_page(request.GET.get("page"))
+        orders = page.object_list
+
+    return render(request, "delivery/delivery_dashboard.html", {
+        "orders": orders,
+        "view": view,
+        "page": page,
+        "active_count": counts["active"],
+        "done_count": counts["done"],
+        "live_stream": getattr(settings, "ORDER_EVENTS_STREAM", False),
+        "poll_seconds": getattr(settings, "ORDER_EVENTS_POLL_SECONDS", 30),
+    })
 
 
 @delivery_required
@@ -24,51 +66,87 @@ def delivery_update_status(request, order_id):
     if request.method != "POST":
         return redirect("delivery:delivery_order_detail", order_id=order.id)
 
-    if order.status == "cancelled":
-        messages.error(request, "Cancelled orders cannot be updated.")
+    new_status = request.POST.get("status", "")
+    error = transition_error(order, new_status)
+    if error:
+        if order.status == "delivered":
+            messages.info(request, error)
+        else:
+            messages.error(request, error)
         return redirect("delivery:delivery_order_detail", order_id=order.id)
 
-    if order.status == "delivered":
-        messages.info(request, "This order is already delivered.")
+    # conditional UPDATE: a concurrent request can't move (or count) it twice
+    result = advance_orders(request.user, [order.id], new_status)[0]
+    if not result["ok"]:
+        messages.error(request, result["error"])
         return redirect("delivery:delivery_order_detail", order_id=order.id)
+    order.status = result["status"]
 
-    # Prevent delivery updates if Razorpay payment not completed
-    if order.payment_method == "razorpay" and not order.is_paid:
-        messages.error(request, "Cannot update status until payment is completed.")
-        return redirect("delivery:delivery_order_detail", order_id=order.id)
+    messages.success(request, f"Order status updated to {order.status}.")
+    return redirect("delivery:delivery_order_detail", order_id=order.id)
 
-    new_status = request.POST.get("status")
+MAX_BATCH_SIZE = 200
 
-    # Strict next-step progression
-    next_status_map = {
-        "placed": "packed",
-        "packed": "shipped",
-        "shipped": "delivered",
-    }
 
-    expected_next = next_status_map.get(order.status)
+@delivery_required
+def delivery_advance_orders(request):
+    """
+    Move many orders one step each. Accepts a form post (``order_ids`` list,
+    optional ``status``) or JSON ``{"order_ids": [...], "status": "shipped"}``;
+    JSON requests get per-order results back.
+    """
+    if request.method != "POST":
+        return redirect("delivery:delivery_dashboard")
 
-    if not expected_next:
-        messages.error(request, "Invalid current order status.")
-        return redirect("delivery:delivery_order_detail", order_id=order.id)
+    wants_json = request.content_type == "application/json"
+    if wants_json:
+        try:
+            data = json.loads(request.body or b"{}")
+            raw_ids = data.get("order_ids", [])
+            new_status = data.get("status") or None
+            if not isinstance(raw_ids, list):
+                raise ValueError
+        except (ValueError, AttributeError):
+            return JsonResponse({"error": "Expected a JSON body with a list of order_ids."}, status=400)
+    else:
+        raw_ids = request.POST.getlist("order_ids")
+        new_status = request.POST.get("status") or None
+
+    order_ids = [int(i) for i in raw_ids if str(i).isdigit()]
+    if len(order_ids) > MAX_BATCH_SIZE:
+        error = f"Update at most {MAX_BATCH_SIZE} orders at a time."
+        if wants_json:
+            return JsonResponse({"error": error}, status=400)
+        messages.error(request, error)
+        return redirect("delivery:delivery_dashboard")
+    results = advance_orders(request.user, order_ids, new_status) if order_ids else []
+    moved = sum(1 for r in results if r["ok"])
 
-    if new_status != expected_next:
-        messages.error(
-            request,
-            f"Invalid update. From '{order.status}' you can only move to '{expected_next}'."
-        )
-        return redirect("delivery:delivery_order_detail", order_id=order.id)
+    if wants_json:
+        return JsonResponse({"updated": moved, "results": results})
 
-    order.status = new_status
+    if moved:
+        messages.success(request, f"Updated {moved} orders.")
+    for r in results:
+        if not r["ok"]:
+            messages.error(request, f"Order #{r['id']}: {r['error']}")
+    if not results:
+        messages.error(request, "Select some orders first.")
+    return redirect("delivery:delivery_dashboard")
 
-    # Optional: mark COD paid automatically when delivered
-    if order.status == "delivered" and order.payment_method == "cod":
-        order.is_paid = True
 
-    order.save()
+@delivery_required
+def delivery_sync(request):
+    """
+    JSON delta of the user's orders since ``?cursor=`` (see ``delivery.sync``).
+    Without a cursor the response is a full snapshot of open orders.
+    """
+    size = getattr(settings, "DELIVERY_SYNC_PAGE_SIZE", 200)
+    limit = request.GET.get("limit", "")
+    if limit.isdigit() and int(limit):
+        size = min(int(limit), size)
+    return JsonResponse(changes(request.user, request.GET.get("cursor"), size))
 
-    messages.success(request, f"Order status updated to {order.status}.")
-    return redirect("delivery:delivery_order_detail", order_id=order.id)
 
 def delivery_login(request):
     if request.user.is_authenticated: